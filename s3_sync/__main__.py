@@ -18,8 +18,8 @@ import logging
 import os
 import traceback
 
-from container_crawler import ContainerCrawler
 from .daemon_utils import load_swift, setup_context, setup_logger
+from .limits import configure_limits
 
 
 def main():
@@ -31,6 +31,7 @@ def main():
     setup_logger(logger_name, conf)
     load_swift(logger_name, args.once)
 
+    from .crawler import SyncCrawler
     from .sync_container import SyncContainer
     logger = logging.getLogger(logger_name)
     logger.debug('Starting S3Sync')
@@ -42,8 +43,10 @@ def main():
         logger.debug('Using HTTPS proxy %r', conf['https_proxy'])
         os.environ['https_proxy'] = conf['https_proxy']
 
+    configure_limits(conf)
+
     try:
-        crawler = ContainerCrawler(conf, SyncContainer, logger)
+        crawler = SyncCrawler(conf, SyncContainer, logger)
         if args.once:
             crawler.run_once()
         else:
@@ -0,0 +1,105 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import base64
+import hashlib
+import math
+import struct
+
+
+# The index of the objects that were archived and removed from a container is
+# kept in the container's system metadata, with one entry per container
+# database (each replica is processed by a different node).
+HEADER_PREFIX = 'X-Container-Sysmeta-Shunt-Archive-Index-'
+# Prefix of the entries in the sysmeta of the proxy's container info
+SYSMETA_PREFIX = 'shunt-archive-index-'
+
+# The size is bounded by the maximum length of a header line (8KB)
+DEFAULT_SIZE = 4096
+DEFAULT_HASHES = 7
+# Once it contains more names, the filter is no longer used
+FALSE_POSITIVE_RATE = 0.01
+
+
+class BloomFilter(object):
+    """Set of names that may report names that were never added (with a
+    probability bounded by FALSE_POSITIVE_RATE, until the filter is
+    saturated), but never misses a name that was added.
+    """
+    def __init__(self, size=DEFAULT_SIZE, hashes=DEFAULT_HASHES, count=0,
+                 bits=None):
+        self.hashes = hashes
+        self.count = count
+        self.bits = bytearray(size) if bits is None else bytearray(bits)
+        self.capacity = int(len(self.bits) * 8 * math.log(2) ** 2 /
+                            -math.log(FALSE_POSITIVE_RATE))
+
+    def _positions(self, name):
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        first, second = struct.unpack('>QQ', hashlib.md5(name).digest())
+        nbits = len(self.bits) * 8
+        return [(first + i * second) % nbits for i in range(self.hashes)]
+
+    def add(self, name):
+        added = False
+        for position in self._positions(name):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, name):
+        for position in self._positions(name):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                return False
+        return True
+
+    @property
+    def saturated(self):
+        return self.count > self.capacity
+
+    def serialize(self):
+        return '%d:%d:%s' % (self.hashes, self.count,
+                             base64.b64encode(bytes(self.bits)))
+
+    @classmethod
+    def deserialize(cls, value):
+        hashes, count, bits = value.split(':', 2)
+        bits = base64.b64decode(bits)
+        return cls(len(bits), int(hashes), int(count), bits)
+
+
+def is_archived(sysmeta, name):
+    """Checks the container's archive index for the object.
+
+    :param sysmeta: the sysmeta of the container's info.
+    :returns: True if the object may have been archived and removed from the
+              container, False if it has not (or the index is missing).
+    """
+    for key, value in sysmeta.items():
+        if not key.lower().startswith(SYSMETA_PREFIX):
+            continue
+        try:
+            index = BloomFilter.deserialize(value)
+        except (TypeError, ValueError):
+            continue
+        if not index.saturated and name in index:
+            return True
+    return False
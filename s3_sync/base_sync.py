@@ -17,6 +17,9 @@ limitations under the License.
 import eventlet
 import logging
 
+from .limits import get_endpoint_limiter, get_rate_limiter
+from .utils import DEFAULT_CHUNK_SIZE
+
 
 class ProviderResponse(object):
     def __init__(self, success, status, headers, body):
@@ -38,6 +41,9 @@ class BaseSync(object):
     """
 
     HTTP_CONN_POOL_SIZE = 1
+    # Response statuses that signal that the remote store is overloaded and
+    # we should slow down (498 is returned by the Swift ratelimit middleware)
+    THROTTLE_STATUSES = (429, 498, 503)
     SLO_WORKERS = 10
     SLO_QUEUE_SIZE = 100
     MB = 1024 * 1024
@@ -49,11 +55,31 @@ class BaseSync(object):
                 BaseSync.HTTP_CONN_POOL_SIZE)
             self.client = client
             self.pool = pool
+            # Request slot checked out from the endpoint limiter (if any)
+            self.endpoint_slot = None
+            self.throttled = False
 
         def acquire(self):
             return self.semaphore.acquire(blocking=False)
 
+        def record_status(self, status):
+            """Records the status of a response that did not raise an error.
+
+            Used to let the endpoint limiter know about throttling responses
+            that are converted into a ProviderResponse.
+            """
+            if status in BaseSync.THROTTLE_STATUSES:
+                self.throttled = True
+
         def close(self):
+            if self.endpoint_slot:
+                if self.throttled:
+                    self.endpoint_slot.backoff()
+                else:
+                    self.endpoint_slot.grow()
+                self.endpoint_slot.release()
+                self.endpoint_slot = None
+            self.throttled = False
             self.semaphore.release()
             self.pool.release()
 
@@ -61,12 +87,22 @@ class BaseSync(object):
             return self.client
 
         def __exit__(self, exc_type, exc_value, traceback):
+            if exc_value is not None and self.pool.is_throttle_error(
+                    exc_value):
+                self.throttled = True
             self.close()
 
     class HttpClientPool(object):
-        def __init__(self, client_factory, max_conns):
+        def __init__(self, client_factory, max_conns, endpoint_limiter=None,
+                     is_throttle_error=None, rate_limiter=None):
             self.get_semaphore = eventlet.semaphore.Semaphore(max_conns)
             self.client_pool = self._create_pool(client_factory, max_conns)
+            self.endpoint_limiter = endpoint_limiter
+            self.rate_limiter = rate_limiter
+            if is_throttle_error:
+                self.is_throttle_error = is_throttle_error
+            else:
+                self.is_throttle_error = lambda error: False
 
         def _create_pool(self, client_factory, max_conns):
             clients = max_conns / BaseSync.HTTP_CONN_POOL_SIZE
@@ -78,10 +114,24 @@ class BaseSync(object):
             # calculated pool_size
             return []
 
-        def get_client(self):
+        def get_client(self, data=False):
+            # Pace the requests before taking any connections, so that we do
+            # not hold on to them while sleeping.
+            if self.rate_limiter:
+                self.rate_limiter.consume_request()
             # SLO uploads may exhaust the client pool and we will need to wait
             # for connections
             self.get_semaphore.acquire()
+            # The local pool is checked first, so that we do not hold on to a
+            # shared endpoint slot while waiting for our own connections.
+            endpoint_slot = None
+            if self.endpoint_limiter:
+                endpoint_slot = self.endpoint_limiter.acquire(data)
+            entry = self._get_entry()
+            entry.endpoint_slot = endpoint_slot
+            return entry
+
+        def _get_entry(self):
             # we are guaranteed that there is an open connection we can use
             # or we should create one
             for client in self.client_pool:
@@ -132,8 +182,17 @@ class BaseSync(object):
         self.endpoint = settings.get('aws_endpoint', None)
         self.aws_bucket = settings['aws_bucket']
 
+        # Bandwidth and request rate limits for this mapping
+        self.rate_limiter = get_rate_limiter(settings, per_account)
+        # Objects up to this size are buffered while they are uploaded, so
+        # that retries do not re-read them from Swift
+        self.spool_size = int(settings.get('spool_object_size', 0))
+        # Size of the chunks read from the remote store
+        self.chunk_size = int(settings.get('chunk_size', DEFAULT_CHUNK_SIZE))
         self.client_pool = self.HttpClientPool(
-            self._get_client_factory(), max_conns)
+            self._get_client_factory(), max_conns,
+            get_endpoint_limiter(self.endpoint, self.aws_bucket),
+            self._is_throttle_error, self.rate_limiter)
 
     def __repr__(self):
         return '<%s: %s/%s>' % (
@@ -173,6 +232,13 @@ class BaseSync(object):
     def _get_client_factory(self):
         raise NotImplementedError()
 
+    def _is_throttle_error(self, error):
+        """Returns True if the exception signals that we are being throttled.
+
+        Used to adjust the adaptive concurrency limits for the endpoint.
+        """
+        return False
+
     def _full_name(self, key):
         return u'%s/%s/%s' % (self.account, self.container,
                               key.decode('utf-8'))
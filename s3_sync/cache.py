@@ -0,0 +1,139 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import hashlib
+import itertools
+import json
+import math
+import time
+import uuid
+
+
+class LRUCache(object):
+    """Cache bounded by the number of entries, each of which expires after
+    ttl seconds. When full, the least recently used entry is evicted.
+
+    A max_size of 0 disables the cache.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        """Returns the cached value or None if it is missing or expired."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.time():
+            return None
+        self._entries[key] = entry
+        return value
+
+    def put(self, key, value):
+        if not self.max_size:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (time.time() + self.ttl, value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ListingCache(object):
+    """Cache of the pages of remote listings, keyed by the container and the
+    listing query.
+
+    The pages are stored with the current generation of their container,
+    which changes when the container is written to, invalidating all of the
+    container's pages at once. The pages are kept in the proxy's memory or,
+    if one is supplied, in memcache, so that they are shared by the proxies.
+
+    A max_size of 0 disables the in-memory cache.
+    """
+    GENERATION_PREFIX = 'shunt/listing-generation/'
+    PAGE_PREFIX = 'shunt/listing/'
+
+    def __init__(self, max_size, ttl):
+        self.ttl = ttl
+        self.pages = LRUCache(max_size, ttl)
+        # A generation that was evicted is replaced with a new one, which
+        # invalidates the pages that are still cached.
+        self.generations = LRUCache(max_size, float('inf'))
+        self._counter = itertools.count()
+
+    def _new_generation(self, memcache):
+        if memcache:
+            return uuid.uuid4().hex
+        return next(self._counter)
+
+    def _generation(self, container, memcache):
+        if memcache:
+            key = self.GENERATION_PREFIX + '/'.join(container)
+            generation = memcache.get(key)
+        else:
+            generation = self.generations.get(container)
+        if generation is None:
+            generation = self.invalidate(container, memcache)
+        return generation
+
+    def _page_key(self, generation, query):
+        return self.PAGE_PREFIX + '%s/%s' % (
+            generation, hashlib.md5(json.dumps(query)).hexdigest())
+
+    def get(self, container, query, memcache=None):
+        """Returns the cached page or None if it is missing.
+
+        :param container: the (account, container) tuple.
+        :param query: the (marker, limit, prefix, delimiter) tuple.
+        :param memcache: the memcache client to use, if any.
+        """
+        if not memcache and not self.pages.max_size:
+            return None
+        generation = self._generation(container, memcache)
+        if memcache:
+            return memcache.get(self._page_key(generation, query))
+        return self.pages.get((generation, query))
+
+    def put(self, container, query, page, memcache=None):
+        if not memcache and not self.pages.max_size:
+            return
+        generation = self._generation(container, memcache)
+        if memcache:
+            memcache.set(self._page_key(generation, query), page,
+                         time=int(math.ceil(self.ttl)))
+        else:
+            self.pages.put((generation, query), page)
+
+    def invalidate(self, container, memcache=None):
+        """Invalidates the cached pages of the container.
+
+        :returns: the new generation of the container.
+        """
+        generation = self._new_generation(memcache)
+        if memcache:
+            memcache.set(self.GENERATION_PREFIX + '/'.join(container),
+                         generation)
+        elif self.pages.max_size:
+            self.generations.put(container, generation)
+        return generation
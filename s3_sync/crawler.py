@@ -0,0 +1,181 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import time
+
+from container_crawler import ContainerCrawler
+from swift.common.ring import Ring
+from swift.common.utils import hash_path, storage_directory
+from swift.container.backend import DATADIR
+
+from .journal import JournalReader
+
+
+class SyncCrawler(ContainerCrawler):
+    """Crawls the synced containers every poll_interval.
+
+    If the proxies journal the changes to the objects (journal_dir is set),
+    the containers that changed are also processed between the crawls, as
+    soon as the journal files are complete.
+
+    With db_watch, the container databases on the node are checked every
+    db_watch_interval and only the containers whose databases (or sync
+    status) changed are processed. Every container is still crawled every
+    full_crawl_interval, while the mappings of whole accounts (whose
+    containers are not watched) are crawled every poll_interval. The crawls
+    ensure that every change is eventually synced.
+    """
+    def __init__(self, conf, handler_class, logger=None):
+        super(SyncCrawler, self).__init__(conf, handler_class, logger)
+        self.conf = conf
+        self.poll_interval = conf.get('poll_interval', 5)
+        self.journal = None
+        if conf.get('journal_dir'):
+            self.journal = JournalReader(conf['journal_dir'])
+        self.journal_interval = float(conf.get('journal_interval', 1))
+        self.db_watch = conf.get('db_watch', False)
+        self.db_watch_interval = float(conf.get('db_watch_interval', 1))
+        self.full_crawl_interval = float(
+            conf.get('full_crawl_interval', 600))
+        # Signatures of the containers' databases as of the last pass
+        self.signatures = {}
+        self._ring = None
+
+    def run_always(self):
+        if not self.journal and not self.db_watch:
+            return super(SyncCrawler, self).run_always()
+        intervals = []
+        if self.journal:
+            intervals.append(self.journal_interval)
+        if self.db_watch:
+            intervals.append(self.db_watch_interval)
+            crawl_interval = self.full_crawl_interval
+        else:
+            crawl_interval = self.poll_interval
+        while True:
+            start = time.time()
+            if self.db_watch:
+                # Taken before the crawl, so that the changes made while
+                # crawling are picked up by the next pass
+                signatures = self._get_signatures()
+            self.run_once()
+            if self.db_watch:
+                self.signatures = signatures
+            accounts_crawled = start
+            while True:
+                remaining = crawl_interval - (time.time() - start)
+                if remaining <= 0:
+                    break
+                time.sleep(min([remaining] + intervals))
+                if self.journal:
+                    self.run_journaled()
+                if self.db_watch:
+                    self.run_changed()
+                    if time.time() - accounts_crawled >= self.poll_interval:
+                        accounts_crawled = time.time()
+                        self.run_accounts()
+
+    def run_journaled(self):
+        """Processes the mappings of the containers in the journal."""
+        changed = self.journal.read()
+        if not changed:
+            return
+        accounts = set(account for account, _ in changed)
+        mappings = [
+            mapping for mapping in self.conf['containers']
+            if (mapping['account'], mapping['container']) in changed or
+            (mapping['container'] == '/*' and mapping['account'] in accounts)]
+        if mappings:
+            self._run_mappings(mappings)
+
+    def _run_mappings(self, mappings):
+        # Run a crawl that is restricted to the mappings
+        containers = self.conf['containers']
+        self.conf['containers'] = mappings
+        try:
+            self.run_once()
+        finally:
+            self.conf['containers'] = containers
+
+    def run_changed(self):
+        """Processes the containers whose databases changed since the last
+        pass. The mappings of whole accounts are processed by run_accounts().
+        """
+        signatures = self._get_signatures()
+        mappings = [
+            mapping for mapping in self.conf['containers']
+            if _mapping_key(mapping) in signatures and
+            signatures[_mapping_key(mapping)] !=
+            self.signatures.get(_mapping_key(mapping))]
+        if mappings:
+            self._run_mappings(mappings)
+        self.signatures = signatures
+
+    def run_accounts(self):
+        """Processes the mappings of whole accounts."""
+        mappings = [mapping for mapping in self.conf['containers']
+                    if mapping['container'] == '/*']
+        if mappings:
+            self._run_mappings(mappings)
+
+    def _get_signatures(self):
+        return dict((_mapping_key(mapping), self._get_signature(mapping))
+                    for mapping in self.conf['containers']
+                    if mapping['container'] != '/*')
+
+    def _get_signature(self, mapping):
+        """Returns the state of the container's databases on this node, as
+        their sizes and modification times (and those of their pending
+        files), along with the sync status. The databases are not opened.
+
+        The sync status is included, so that containers that were only
+        partly processed are processed again.
+        """
+        account, container = _mapping_key(mapping)
+        signature = []
+        for path in self._get_db_paths(account, container):
+            for name in (path, path + '.pending'):
+                try:
+                    stat = os.stat(name)
+                    signature.append((stat.st_mtime, stat.st_size))
+                except OSError:
+                    signature.append(None)
+        status_file = os.path.join(
+            self.conf['status_dir'], mapping['account'], mapping['container'])
+        try:
+            with open(status_file) as fp:
+                signature.append(fp.read())
+        except IOError:
+            signature.append(None)
+        return tuple(signature)
+
+    def _get_db_paths(self, account, container):
+        if self._ring is None:
+            self._ring = Ring(self.conf.get('swift_dir', '/etc/swift'),
+                              ring_name='container')
+        part, nodes = self._ring.get_nodes(account, container)
+        name_hash = hash_path(account, container)
+        devices = self.conf.get('devices', '/srv/node')
+        return [os.path.join(devices, node['device'],
+                             storage_directory(DATADIR, part, name_hash),
+                             name_hash + '.db')
+                for node in nodes]
+
+
+def _mapping_key(mapping):
+    return (mapping['account'].encode('utf-8'),
+            mapping['container'].encode('utf-8'))
@@ -0,0 +1,129 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import eventlet
+import time
+
+from swift.common.utils import close_if_possible
+
+
+_hedgers = {}
+
+# Number of the most recent response times used to compute the delay
+LATENCY_WINDOW = 1000
+# Requests are not hedged until enough response times have been observed
+MIN_SAMPLES = 20
+# Maximum number of hedged requests that can be sent back to back
+MAX_BURST = 10
+
+
+class Hedger(object):
+    """Issues a second (hedged) request if the first one takes longer than
+    the given percentile of the recent response times, and returns the
+    response that arrives first.
+
+    Every request earns the budget a fraction of a hedged request, which
+    bounds the extra load on the remote store.
+    """
+    def __init__(self, percentile, budget, min_delay=0):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.tokens = 0
+
+    def delay(self):
+        """Returns the time to wait for a response before hedging, or None if
+        the request should not be hedged.
+        """
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1,
+                    int(len(latencies) * self.percentile / 100.0))
+        return max(self.min_delay, latencies[index])
+
+    def _take_token(self):
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def call(self, request):
+        """Issues the request, hedging it if needed.
+
+        :param request: function that issues the request, returning the
+                        (status, headers, body iterator) tuple. It is called
+                        twice if the request is hedged; the body of the
+                        response that is not used is closed.
+        """
+        self.tokens = min(MAX_BURST, self.tokens + self.budget)
+        delay = self.delay()
+        results = eventlet.queue.LightQueue()
+
+        def _issue():
+            start = time.time()
+            try:
+                response = request()
+            except Exception as e:
+                results.put((False, e))
+                return
+            self.latencies.append(time.time() - start)
+            results.put((True, response))
+
+        eventlet.spawn_n(_issue)
+        pending = 1
+        try:
+            success, result = results.get(timeout=delay)
+        except eventlet.queue.Empty:
+            if self._take_token():
+                eventlet.spawn_n(_issue)
+                pending += 1
+            success, result = results.get()
+        pending -= 1
+        if not success and pending:
+            # Fall back to the other request
+            success, result = results.get()
+            pending -= 1
+        if pending:
+            eventlet.spawn_n(_close_responses, results, pending)
+        if not success:
+            raise result
+        return result
+
+
+def _close_responses(results, count):
+    for _ in range(count):
+        success, result = results.get()
+        if success:
+            close_if_possible(result[2])
+
+
+def get_hedger(settings):
+    """Returns the hedger for a sync mapping, shared by all of the requests
+    for the mapping. Returns None if the requests are not hedged.
+    """
+    percentile = settings.get('hedge_percentile')
+    if not percentile:
+        return None
+    key = (settings['account'], settings.get('aws_endpoint'),
+           settings['aws_bucket'])
+    if key not in _hedgers:
+        _hedgers[key] = Hedger(
+            float(percentile), float(settings.get('hedge_budget', 0.1)),
+            float(settings.get('hedge_min_delay', 0)))
+    return _hedgers[key]
@@ -0,0 +1,233 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import errno
+import json
+import os
+import time
+
+from swift.common import constraints, utils
+
+
+DEFAULT_JOURNAL_DIR = '/var/lib/swift-s3-sync/journal'
+# Every proxy worker starts a new journal file once per interval (in
+# seconds), so that the files can be consumed once they are no longer
+# written to.
+ROTATE_INTERVAL = 1
+JOURNAL_SUFFIX = '.journal'
+# Bounds of the journal, in case the daemon does not consume it. Once they
+# are reached, the changes are no longer journaled (the crawls still sync
+# them).
+DEFAULT_MAX_FILES = 1000
+DEFAULT_MAX_FILE_SIZE = 4 * 2 ** 20
+
+JOURNALED_METHODS = ('PUT', 'POST', 'DELETE')
+
+
+def _current_period():
+    return int(time.time() // ROTATE_INTERVAL)
+
+
+class JournalWriter(object):
+    """Appends the records to the journal file of the current process, one
+    JSON object per line.
+
+    A new file is started every period, so that the daemon picks up the
+    changes within seconds. No file is started while the journal holds
+    max_files files, and a file holds at most max_file_size bytes.
+    """
+    def __init__(self, journal_dir, max_files=DEFAULT_MAX_FILES,
+                 max_file_size=DEFAULT_MAX_FILE_SIZE):
+        self.journal_dir = journal_dir
+        self.max_files = max_files
+        self.max_file_size = max_file_size
+        self._fd = None
+        self._period = None
+        self._size = 0
+
+    def _open(self, period):
+        self.close()
+        self._period = period
+        if not os.path.isdir(self.journal_dir):
+            try:
+                os.makedirs(self.journal_dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        files = sum(1 for name in os.listdir(self.journal_dir)
+                    if name.endswith(JOURNAL_SUFFIX))
+        if files >= self.max_files:
+            return
+        path = os.path.join(self.journal_dir, '%d-%d%s' % (
+            period, os.getpid(), JOURNAL_SUFFIX))
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                           0o644)
+
+    def append(self, record):
+        """Appends the record to the journal.
+
+        :returns: False if the record was dropped, as the journal is full.
+        """
+        period = _current_period()
+        if period != self._period:
+            self._open(period)
+        line = json.dumps(record) + '\n'
+        if self._fd is None or self._size + len(line) > self.max_file_size:
+            return False
+        # A single write, so that the lines are never interleaved
+        os.write(self._fd, line)
+        self._size += len(line)
+        return True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._period = None
+        self._size = 0
+
+
+class JournalReader(object):
+    """Consumes the journal files that the proxies no longer write to."""
+    def __init__(self, journal_dir):
+        self.journal_dir = journal_dir
+
+    def read(self):
+        """Reads and removes the complete journal files.
+
+        :returns: the set of (account, container) tuples that the records
+                  refer to.
+        """
+        try:
+            names = os.listdir(self.journal_dir)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return set()
+        # The files of the previous period may still be written to by
+        # requests that started before it ended
+        last_period = _current_period() - 1
+        containers = set()
+        for name in sorted(names):
+            if not name.endswith(JOURNAL_SUFFIX):
+                continue
+            try:
+                period = int(name.split('-', 1)[0])
+            except ValueError:
+                continue
+            if period >= last_period:
+                continue
+            path = os.path.join(self.journal_dir, name)
+            with open(path) as fp:
+                for line in fp:
+                    try:
+                        record = json.loads(line)
+                        containers.add(
+                            (record['account'], record['container']))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+            os.unlink(path)
+        return containers
+
+
+class JournalMiddleware(object):
+    """Journals the changes to the objects in the synced containers, so that
+    the sync daemon can process the containers before its next crawl.
+    """
+    def __init__(self, app, conf):
+        self.app = app
+        self.logger = utils.get_logger(
+            conf, name='proxy-server:s3_sync.journal',
+            log_route='s3_sync.journal')
+        self.writer = JournalWriter(
+            conf.get('journal_dir', DEFAULT_JOURNAL_DIR),
+            int(conf.get('journal_max_files', DEFAULT_MAX_FILES)),
+            int(conf.get('journal_max_file_size', DEFAULT_MAX_FILE_SIZE)))
+        self._journal_full = False
+        conf_file = conf.get('conf_file', '/etc/swift-s3-sync/sync.json')
+        self.containers = set()
+        # Accounts where all containers are synced
+        self.accounts = set()
+        try:
+            with open(conf_file, 'rb') as fp:
+                mappings = json.load(fp)['containers']
+        except (IOError, ValueError, KeyError) as err:
+            self.logger.warning("Couldn't read conf_file %r: %s; disabling",
+                                conf_file, err)
+            mappings = []
+        for mapping in mappings:
+            account = mapping['account'].encode('utf-8')
+            if mapping['container'] == '/*':
+                self.accounts.add(account)
+            else:
+                self.containers.add(
+                    (account, mapping['container'].encode('utf-8')))
+
+    def _is_synced(self, acct, cont):
+        return acct in self.accounts or (acct, cont) in self.containers
+
+    def __call__(self, env, start_response):
+        if env['REQUEST_METHOD'] not in JOURNALED_METHODS:
+            return self.app(env, start_response)
+        try:
+            vers, acct, cont, obj = utils.split_path(
+                env['PATH_INFO'], 4, 4, True)
+        except ValueError:
+            return self.app(env, start_response)
+        if not constraints.valid_api_version(vers) or \
+                not self._is_synced(acct, cont):
+            return self.app(env, start_response)
+
+        statuses = []
+
+        def _start_response(status, headers, exc_info=None):
+            statuses.append(status)
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.app(env, _start_response)
+        if statuses and statuses[-1].startswith('2'):
+            self._append(env, acct, cont, obj)
+        return app_iter
+
+    def _append(self, env, acct, cont, obj):
+        # The proxy sets the timestamp of the request in its environment
+        timestamp = env.get('HTTP_X_TIMESTAMP') or \
+            utils.Timestamp(time.time()).internal
+        record = {'account': acct,
+                  'container': cont,
+                  'object': obj,
+                  'timestamp': timestamp,
+                  'op': env['REQUEST_METHOD']}
+        try:
+            journaled = self.writer.append(record)
+        except (IOError, OSError) as err:
+            # The crawler still picks up the change
+            self.logger.warning('Failed to journal %s %s: %s' % (
+                env['REQUEST_METHOD'], env['PATH_INFO'], err))
+            return
+        if not journaled and not self._journal_full:
+            # The crawler still picks up the changes
+            self.logger.warning('The journal %r is full; not journaling '
+                                'the changes' % self.writer.journal_dir)
+        self._journal_full = not journaled
+
+
+def filter_factory(global_conf, **local_conf):
+    conf = dict(global_conf, **local_conf)
+
+    def app_filter(app):
+        return JournalMiddleware(app, conf)
+    return app_filter
@@ -0,0 +1,321 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import eventlet
+import time
+
+
+# Process-wide settings, populated from the top-level configuration with
+# configure_limits(). Providers created before the configuration is loaded
+# (or in processes that never load it) are not limited.
+_settings = {
+    'endpoint_control_conns': None,
+    'endpoint_data_conns': None,
+    'adaptive_concurrency': False,
+    'spool_memory_limit': None,
+    'spool_dir': None,
+}
+_endpoint_limiters = {}
+# The limiter for all of the traffic of the process, if configured
+_global_rate_limiter = None
+_rate_limiters = {}
+# Upper bound on the adaptive limits, if the endpoint limits are not set
+DEFAULT_ADAPTIVE_CONNS = 64
+# Bytes currently held by the upload spool buffers
+_spool_usage = {'bytes': 0}
+DEFAULT_SPOOL_MEMORY_LIMIT = 64 * 2 ** 20
+
+
+class AdaptiveSemaphore(object):
+    """Semaphore with a limit that can be adjusted while it is in use.
+
+    When adaptive, the limit follows additive-increase/multiplicative-decrease
+    (AIMD): it is halved whenever the remote store throttles a request and
+    grows by roughly one slot for every window of successful requests, up to
+    the configured maximum.
+    """
+    BACKOFF_FACTOR = 0.5
+    # Requests that were in flight when we backed off are likely to be
+    # throttled as well. We ignore them for this many seconds, so that one
+    # congestion event only shrinks the limit once.
+    BACKOFF_INTERVAL = 1.0
+
+    def __init__(self, max_limit, adaptive=False, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = float(max_limit)
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.last_backoff = 0
+        self._waiters = collections.deque()
+
+    @property
+    def balance(self):
+        return int(self.limit) - self.in_flight
+
+    def acquire(self):
+        while self.balance <= 0:
+            waiter = eventlet.event.Event()
+            self._waiters.append(waiter)
+            waiter.wait()
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def backoff(self):
+        if not self.adaptive:
+            return
+        now = time.time()
+        if now - self.last_backoff < self.BACKOFF_INTERVAL:
+            return
+        self.last_backoff = now
+        self.limit = max(self.min_limit, self.limit * self.BACKOFF_FACTOR)
+
+    def grow(self):
+        if not self.adaptive or self.limit >= self.max_limit:
+            return
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def _wake(self):
+        for _ in range(min(self.balance, len(self._waiters))):
+            self._waiters.popleft().send()
+
+
+class EndpointLimiter(object):
+    """Bounds the number of requests in flight against a remote endpoint.
+
+    The limiter is shared by every provider that talks to the same endpoint
+    and bucket, so that the total concurrency does not grow with the number
+    of containers being processed at once. Control requests (HEAD, LIST,
+    metadata updates) and data requests (GET, PUT) are bounded separately, so
+    that large transfers do not starve the metadata requests.
+
+    If adaptive, the limits are treated as the upper bound and are adjusted
+    based on whether the remote store throttles our requests (see
+    AdaptiveSemaphore).
+    """
+    def __init__(self, control_conns, data_conns, adaptive=False):
+        self.control = AdaptiveSemaphore(control_conns, adaptive)
+        self.data = AdaptiveSemaphore(data_conns, adaptive)
+
+    def acquire(self, data=False):
+        """Block until a request slot is available.
+
+        :returns: the semaphore that must be released once the request
+                  completes.
+        """
+        semaphore = self.data if data else self.control
+        semaphore.acquire()
+        return semaphore
+
+
+class TokenBucket(object):
+    """Paces the consumers to the given rate (units per second).
+
+    Consumers may take more tokens than are available, in which case they
+    sleep until the debt is repaid. The following consumers then have to wait
+    for the debt, as well, which keeps the long-term rate at the limit
+    regardless of how large each request is.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.last_update = time.time()
+
+    def consume(self, amount=1):
+        now = time.time()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last_update) * self.rate)
+        self.last_update = now
+        self.tokens -= amount
+        if self.tokens < 0:
+            eventlet.sleep(-self.tokens / self.rate)
+
+
+class RateLimiter(object):
+    """Limits the bandwidth (bytes/s) and the request rate (requests/s).
+
+    The limits are read from the "bandwidth_limit" and "request_rate"
+    settings. Optionally, "rate_schedule" overrides them during parts of the
+    day, e.g.:
+
+        "rate_schedule": [
+            {"start": "08:00", "end": "18:00", "bandwidth_limit": 1048576}
+        ]
+
+    Windows may wrap around midnight and use the local time. Limits that are
+    not set in a window fall back to the defaults. A limit of 0 (or unset)
+    means no limit. If a parent limiter is supplied, the traffic is also
+    accounted against it.
+    """
+    SCHEDULE_CHECK_INTERVAL = 60
+
+    def __init__(self, settings, parent=None):
+        self.parent = parent
+        self.default_limits = (settings.get('bandwidth_limit'),
+                               settings.get('request_rate'))
+        self.schedule = []
+        for window in settings.get('rate_schedule', []):
+            limits = (window.get('bandwidth_limit', self.default_limits[0]),
+                      window.get('request_rate', self.default_limits[1]))
+            self.schedule.append((self._parse_time(window['start']),
+                                  self._parse_time(window['end']),
+                                  limits))
+        self.limits = None
+        self.bandwidth = None
+        self.requests = None
+        self.next_check = 0
+
+    @staticmethod
+    def _parse_time(value):
+        hours, minutes = value.split(':')
+        return int(hours) * 60 + int(minutes)
+
+    def current_limits(self, now):
+        local_time = time.localtime(now)
+        minute = local_time.tm_hour * 60 + local_time.tm_min
+        for start, end, limits in self.schedule:
+            if start <= end:
+                if start <= minute < end:
+                    return limits
+            elif minute >= start or minute < end:
+                return limits
+        return self.default_limits
+
+    def _update(self):
+        now = time.time()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.SCHEDULE_CHECK_INTERVAL
+        limits = self.current_limits(now)
+        if limits == self.limits:
+            return
+        self.limits = limits
+        bandwidth, requests = limits
+        self.bandwidth = TokenBucket(bandwidth) if bandwidth else None
+        self.requests = TokenBucket(requests) if requests else None
+
+    def consume_bytes(self, amount):
+        self._update()
+        if self.bandwidth:
+            self.bandwidth.consume(amount)
+        if self.parent:
+            self.parent.consume_bytes(amount)
+
+    def consume_request(self):
+        self._update()
+        if self.requests:
+            self.requests.consume()
+        if self.parent:
+            self.parent.consume_request()
+
+
+def _has_rate_limits(settings):
+    return any(settings.get(key) for key in (
+        'bandwidth_limit', 'request_rate', 'rate_schedule'))
+
+
+def configure_limits(conf):
+    """Load the process-wide limits from the top-level configuration."""
+    global _global_rate_limiter
+
+    for key in ('endpoint_control_conns', 'endpoint_data_conns'):
+        value = conf.get(key)
+        _settings[key] = int(value) if value else None
+    _settings['adaptive_concurrency'] = bool(
+        conf.get('adaptive_concurrency', False))
+    _endpoint_limiters.clear()
+    value = conf.get('spool_memory_limit')
+    _settings['spool_memory_limit'] = int(value) if value else None
+    _settings['spool_dir'] = conf.get('spool_dir')
+
+    if _has_rate_limits(conf):
+        _global_rate_limiter = RateLimiter(conf)
+    else:
+        _global_rate_limiter = None
+    _rate_limiters.clear()
+
+
+def get_rate_limiter(settings, per_account=False):
+    """Returns the rate limiter for a sync mapping.
+
+    The limiter is shared by all of the providers for the mapping (e.g. all
+    of the containers of a per-account mapping) and is chained to the global
+    limiter. Returns None if there are no limits to enforce.
+    """
+    if not _has_rate_limits(settings):
+        return _global_rate_limiter
+    # The mappings of different containers may sync to the same bucket
+    container = '/*' if per_account else settings['container']
+    key = (settings['account'], container, settings.get('aws_endpoint'),
+           settings['aws_bucket'])
+    if key not in _rate_limiters:
+        _rate_limiters[key] = RateLimiter(settings, _global_rate_limiter)
+    return _rate_limiters[key]
+
+
+def get_endpoint_limiter(endpoint, bucket):
+    """Returns the limiter shared by all providers for the endpoint/bucket.
+
+    If neither limit has been configured and the adaptive concurrency control
+    is off, returns None.
+    """
+    control_conns = _settings['endpoint_control_conns']
+    data_conns = _settings['endpoint_data_conns']
+    adaptive = _settings['adaptive_concurrency']
+    if not control_conns and not data_conns:
+        if not adaptive:
+            return None
+        control_conns = data_conns = DEFAULT_ADAPTIVE_CONNS
+    key = (endpoint, bucket)
+    if key not in _endpoint_limiters:
+        # An unset limit falls back to the other one
+        _endpoint_limiters[key] = EndpointLimiter(
+            control_conns or data_conns, data_conns or control_conns,
+            adaptive)
+    return _endpoint_limiters[key]
+
+
+def get_spool_dir():
+    """Returns the directory for the spool files (e.g. on a tmpfs mount).
+
+    If None, the spooled objects are kept in the process memory.
+    """
+    return _settings['spool_dir']
+
+
+def reserve_spool(size):
+    """Reserve space for an object in the upload spool.
+
+    The space is accounted against the process-wide spool_memory_limit.
+
+    :returns: True if the object fits and the space was reserved, False
+              otherwise. Reserved space must be returned with release_spool().
+    """
+    limit = _settings['spool_memory_limit'] or DEFAULT_SPOOL_MEMORY_LIMIT
+    if _spool_usage['bytes'] + size > limit:
+        return False
+    _spool_usage['bytes'] += size
+    return True
+
+
+def release_spool(size):
+    _spool_usage['bytes'] -= size
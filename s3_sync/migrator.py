@@ -342,7 +342,7 @@ class Migrator(object):
     def _migrate_object(self, container, key):
         args = {'bucket': container, 'native': True}
         if self.config.get('protocol', 's3') == 'swift':
-            args['resp_chunk_size'] = 65536
+            args['resp_chunk_size'] = self.provider.chunk_size
         resp = self.provider.get_object(key, **args)
         if resp.status != 200:
             raise MigrationError('Failed to GET %s/%s: %s' % (
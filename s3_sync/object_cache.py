@@ -0,0 +1,214 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import errno
+import os
+import shutil
+import tempfile
+
+from swift.common.utils import close_if_possible
+
+from .utils import DEFAULT_CHUNK_SIZE
+
+
+CacheEntry = collections.namedtuple(
+    'CacheEntry', ['filename', 'etag', 'headers', 'size'])
+
+
+def _unlink(filename):
+    try:
+        os.unlink(filename)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+class ObjectCache(object):
+    """Disk cache of remote objects, bounded by the total size of the objects
+    and evicting the least recently used ones.
+
+    The objects are kept in a directory per process, as the index of the
+    cache is kept in memory. The cached objects must be validated against the
+    remote store by their etag before they are used.
+    """
+    def __init__(self, cache_dir, max_size, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self._dir = None
+
+    @property
+    def enabled(self):
+        return bool(self.cache_dir and self.max_size)
+
+    def _get_dir(self):
+        # The directory is created on first use, as the proxy server forks
+        # its workers after loading the middleware
+        if self._dir is None:
+            self._remove_stale_dirs()
+            self._dir = os.path.join(self.cache_dir, str(os.getpid()))
+            if not os.path.isdir(self._dir):
+                os.makedirs(self._dir)
+        return self._dir
+
+    def _remove_stale_dirs(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if not name.isdigit():
+                continue
+            try:
+                os.kill(int(name), 0)
+            except OSError as e:
+                if e.errno == errno.ESRCH:
+                    shutil.rmtree(os.path.join(self.cache_dir, name),
+                                  ignore_errors=True)
+
+    def open(self, path):
+        """Opens the cached object.
+
+        :returns: the cache entry and a CachedObjectReader, or None if the
+                  object is not cached.
+        """
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return None
+        try:
+            fp = open(entry.filename, 'rb')
+        except IOError:
+            self.size -= entry.size
+            return None
+        self.entries[path] = entry
+        return entry, CachedObjectReader(fp, entry.size, self.chunk_size)
+
+    def invalidate(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry.size
+            _unlink(entry.filename)
+
+    def writer(self, path, etag, headers, size, body):
+        """Wraps the response body to cache the object as it is read.
+
+        :returns: the iterable to use in place of the body.
+        """
+        if not self.enabled or size > self.max_size:
+            return body
+        try:
+            fp = tempfile.NamedTemporaryFile(dir=self._get_dir(),
+                                             delete=False)
+        except (IOError, OSError):
+            return body
+        return CacheWriter(self, path, etag, headers, size, body, fp)
+
+    def _commit(self, path, filename, etag, headers, size):
+        self.invalidate(path)
+        self.entries[path] = CacheEntry(filename, etag, headers, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, entry = self.entries.popitem(last=False)
+            self.size -= entry.size
+            _unlink(entry.filename)
+
+
+class CacheWriter(object):
+    """Writes the object to the cache as the response body is read. The
+    object is only added to the cache once the body has been read in full.
+    """
+    def __init__(self, cache, path, etag, headers, size, body, fp):
+        self.cache = cache
+        self.path = path
+        self.etag = etag
+        self.headers = headers
+        self.size = size
+        self.body = body
+        self.body_iter = iter(body)
+        self.fp = fp
+        self.written = 0
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            chunk = next(self.body_iter)
+        except StopIteration:
+            self._finish()
+            raise
+        if self.fp is not None:
+            try:
+                self.fp.write(chunk)
+                self.written += len(chunk)
+            except (IOError, OSError):
+                self._discard()
+        return chunk
+
+    def _finish(self):
+        if self.fp is None:
+            return
+        if self.written != self.size:
+            self._discard()
+            return
+        try:
+            self.fp.close()
+        except (IOError, OSError):
+            self._discard()
+            return
+        self.cache._commit(self.path, self.fp.name, self.etag, self.headers,
+                           self.size)
+        self.fp = None
+
+    def _discard(self):
+        self.fp.close()
+        _unlink(self.fp.name)
+        self.fp = None
+
+    def close(self):
+        if self.fp is not None:
+            self._discard()
+        close_if_possible(self.body)
+
+
+class CachedObjectReader(object):
+    """Response body of a cached object, which supports ranged reads."""
+    def __init__(self, fp, size, chunk_size):
+        self.fp = fp
+        self.size = size
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return self.app_iter_range(0, None)
+
+    def app_iter_range(self, start, stop):
+        if stop is None:
+            stop = self.size
+        try:
+            self.fp.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = self.fp.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        self.fp.close()
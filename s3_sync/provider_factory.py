@@ -14,15 +14,17 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from .sync_s3 import SyncS3
-from .sync_swift import SyncSwift
-
 
 def create_provider(sync_settings, max_conns, per_account=False):
+    # The providers (and their client libraries) are only imported once a
+    # profile uses them, as the proxy servers load the shunt into every
+    # worker, whether or not they use both kinds of remote stores.
     provider_type = sync_settings.get('protocol', None)
     if not provider_type or provider_type == 's3':
+        from .sync_s3 import SyncS3
         return SyncS3(sync_settings, max_conns, per_account)
     elif provider_type == 'swift':
+        from .sync_swift import SyncSwift
         return SyncSwift(sync_settings, max_conns, per_account)
     else:
         raise NotImplementedError()
@@ -14,8 +14,13 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import eventlet
+import functools
+import itertools
 import json
-from lxml import etree
+import os
+import time
+from xml.sax import saxutils
 
 from swift.common import constraints, swob, utils
 try:
@@ -24,11 +29,70 @@ try:
 except ImportError:
     # compat for < ss-swift-2.15.1.3
     from swift.common.request_helpers import get_listing_content_type
-from swift.proxy.controllers.base import get_account_info
+from swift.proxy.controllers.base import (
+    get_account_info, get_container_info)
 
+from . import archive_index
+from .cache import LRUCache, ListingCache
+from .hedge import get_hedger
+from .object_cache import ObjectCache
 from .provider_factory import create_provider
+from .single_flight import SingleFlight
 from .utils import (check_slo, SwiftPutWrapper, SwiftSloPutWrapper,
-                    convert_to_local_headers, response_is_complete)
+                    convert_to_local_headers, response_is_complete,
+                    DEFAULT_CHUNK_SIZE)
+
+
+# Request headers that make the response depend on more than the object
+CONDITIONAL_HEADERS = ('Range', 'If-Match', 'If-None-Match',
+                       'If-Modified-Since', 'If-Unmodified-Since')
+
+
+# Blacklist of known hop-by-hop headers taken from
+# https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers
+HOP_BY_HOP_HEADERS = set([
+    'connection',
+    'keep-alive',
+    'proxy-authenticate',
+    'proxy-authorization',
+    'te',
+    'trailer',
+    'transfer-encoding',
+    'upgrade',
+])
+
+
+# Environment key of the (profile table, provider) tuples leased by a request
+PROVIDER_LEASES_KEY = 's3_sync.provider_leases'
+
+
+def _get_etag(headers):
+    return next((value for header, value in headers
+                 if header.lower() == 'etag'), None)
+
+
+class LeasedIterable(object):
+    """Releases the providers leased by a request once its response is
+    closed.
+    """
+    def __init__(self, app_iter, leases):
+        self.app_iter = app_iter
+        self.leases = leases
+
+    def __iter__(self):
+        return iter(self.app_iter)
+
+    def close(self):
+        try:
+            utils.close_if_possible(self.app_iter)
+        finally:
+            _release_providers(self.leases)
+
+
+def _release_providers(leases):
+    while leases:
+        table, provider = leases.pop()
+        table.release_provider(provider)
 
 
 class S3SyncProxyFSSwitch(object):
@@ -59,6 +123,92 @@ class S3SyncProxyFSSwitch(object):
             'proxyfs-bimodal'))
 
 
+class ProfileTable(object):
+    """Lookup table of the sync profiles read from the conf_file.
+
+    The table is never modified once built: a new table replaces it when the
+    conf_file changes. The per-container profiles derived from the mappings
+    of whole accounts and the providers that were created for the profiles
+    are cached in the table, so that they are dropped along with it.
+    """
+    # Idle providers kept for every profile
+    MAX_IDLE_PROVIDERS = 4
+
+    def __init__(self, containers, mtime=None, cache_size=1000):
+        self.mtime = mtime
+        # Providers handed out until they are released
+        self._leased = set()
+        self.profiles = {}
+        # Mappings of all of the containers of an account
+        self.wildcards = {}
+        for cont in containers:
+            if cont.get('propagate_delete', True):
+                # object shouldn't exist in remote
+                continue
+            key = (cont['account'].encode('utf-8'),
+                   cont['container'].encode('utf-8'))
+            self.profiles[key] = cont
+            if key[1] == '/*':
+                self.wildcards[key[0]] = cont
+        self._derived = LRUCache(cache_size, float('inf'))
+        self._providers = LRUCache(cache_size, float('inf'))
+
+    @classmethod
+    def load(cls, conf_file, cache_size=1000):
+        """Reads the table from the conf_file.
+
+        :raises IOError, ValueError: if the file cannot be read or parsed.
+        """
+        with open(conf_file, 'rb') as fp:
+            mtime = os.fstat(fp.fileno()).st_mtime
+            conf = json.load(fp)
+        return cls(conf['containers'], mtime, cache_size)
+
+    def lookup(self, acct, cont):
+        """Returns the (sync profile, per_account) tuple for the container,
+        or (None, False) if the container is not synced.
+        """
+        sync_profile = self.profiles.get((acct, cont))
+        if sync_profile is not None:
+            return sync_profile, False
+        if acct not in self.wildcards:
+            return None, False
+        # If mapping all containers, use a profile for just this container
+        sync_profile = self._derived.get((acct, cont))
+        if sync_profile is None:
+            sync_profile = dict(self.wildcards[acct],
+                                container=cont.decode('utf-8'))
+            self._derived.put((acct, cont), sync_profile)
+        return sync_profile, True
+
+    def get_provider(self, sync_profile, max_conns, per_account):
+        """Returns an idle provider for the profile, creating one if all of
+        the cached providers are in use. The provider is in use until it is
+        released with release_provider().
+        """
+        key = (sync_profile['account'], sync_profile['container'],
+               max_conns, per_account)
+        providers = self._providers.get(key)
+        if providers is None:
+            providers = []
+            self._providers.put(key, providers)
+        for provider in providers:
+            # Background restores may still use a released provider
+            if provider not in self._leased and \
+                    provider.client_pool.free_count() == max_conns:
+                break
+        else:
+            provider = create_provider(sync_profile, max_conns=max_conns,
+                                       per_account=per_account)
+            if len(providers) < self.MAX_IDLE_PROVIDERS:
+                providers.append(provider)
+        self._leased.add(provider)
+        return provider
+
+    def release_provider(self, provider):
+        self._leased.discard(provider)
+
+
 class S3SyncShunt(object):
     def __init__(self, app, conf_file, conf):
         self.logger = utils.get_logger(
@@ -66,22 +216,91 @@ class S3SyncShunt(object):
             log_route='s3_sync.shunt')
 
         self.app = app
+        # Objects are restored in the background, after they are returned to
+        # the client. This bounds the number of concurrent restores.
+        self.restore_pool = eventlet.GreenPool(
+            int(conf.get('restore_concurrency', 100)))
+        # Paths of the objects that are being restored
+        self.restoring = set()
+        # Restored objects are spooled to disk; larger objects are fetched
+        # again and streamed into Swift instead
+        self.restore_spool_dir = conf.get('restore_spool_dir')
+        self.restore_max_spool_size = int(
+            conf.get('restore_max_spool_size', 256 * 2 ** 20))
+        # Segments of a restored SLO uploaded in parallel
+        self.segment_concurrency = int(
+            conf.get('restore_segment_concurrency', 4))
+        # Segment containers that are known to exist
+        self.segment_containers = LRUCache(
+            int(conf.get('segment_container_cache_size', 1000)),
+            float(conf.get('segment_container_cache_ttl', 300)))
+        # Concurrent GETs of the same archived object share one remote GET
+        self.single_flight = SingleFlight(
+            int(conf.get('coalesce_max_size', 0)),
+            int(conf.get('coalesce_max_total', 64 * 2 ** 20)))
+        # Remote object metadata (including 404s) and SLO manifests
+        self.metadata_cache = LRUCache(
+            int(conf.get('metadata_cache_size', 0)),
+            float(conf.get('metadata_cache_ttl', 60)))
+        # Pages of the remote listings
+        self.listing_cache = ListingCache(
+            int(conf.get('listing_cache_size', 0)),
+            float(conf.get('listing_cache_ttl', 10)))
+        self.listing_memcache = utils.config_true_value(
+            conf.get('listing_cache_memcache', 'false'))
+        # Archived objects that are read often, but are not restored
+        self.object_cache = ObjectCache(
+            conf.get('object_cache_dir'),
+            int(conf.get('object_cache_size', 0)))
+        # The conf_file is checked for changes at most once per interval
+        self.conf_file = conf_file
+        self.reload_interval = float(conf.get('conf_reload_interval', 10))
+        self.profile_cache_size = int(conf.get('profile_cache_size', 1000))
+        self._next_reload_check = time.time() + self.reload_interval
+        self._reloading = False
         try:
-            with open(conf_file, 'rb') as fp:
-                conf = json.load(fp)
-        except (IOError, ValueError) as err:
+            self.profile_table = ProfileTable.load(
+                conf_file, self.profile_cache_size)
+        except (IOError, ValueError, KeyError) as err:
             self.logger.warning("Couldn't read conf_file %r: %s; disabling",
                                 conf_file, err)
-            conf = {'containers': []}
+            self.profile_table = ProfileTable([])
 
-        self.sync_profiles = {}
-        for cont in conf['containers']:
-            if cont.get('propagate_delete', True):
-                # object shouldn't exist in remote
-                continue
-            key = (cont['account'].encode('utf-8'),
-                   cont['container'].encode('utf-8'))
-            self.sync_profiles[key] = cont
+    @property
+    def sync_profiles(self):
+        return self.profile_table.profiles
+
+    def _check_conf_file(self):
+        now = time.time()
+        if self._reloading or now < self._next_reload_check:
+            return
+        self._next_reload_check = now + self.reload_interval
+        self._reloading = True
+        # The requests keep using the current table until the new one is
+        # ready
+        eventlet.spawn_n(self._reload_conf_file)
+
+    def _reload_conf_file(self):
+        try:
+            try:
+                mtime = os.stat(self.conf_file).st_mtime
+            except OSError:
+                return
+            if mtime == self.profile_table.mtime:
+                return
+            try:
+                table = ProfileTable.load(
+                    self.conf_file, self.profile_cache_size)
+            except (IOError, ValueError, KeyError) as err:
+                self.logger.warning(
+                    "Couldn't reload conf_file %r: %s; keeping the current "
+                    "settings", self.conf_file, err)
+                return
+            self.profile_table = table
+            self.logger.info('Reloaded the sync profiles from %r',
+                             self.conf_file)
+        finally:
+            self._reloading = False
 
     def __call__(self, env, start_response):
         req = swob.Request(env)
@@ -96,27 +315,49 @@ class S3SyncShunt(object):
         if not cont:
             return self.app(env, start_response)
 
-        sync_profile = next((self.sync_profiles[(acct, c)]
-                             for c in (cont, '/*')
-                             if (acct, c) in self.sync_profiles), None)
+        self._check_conf_file()
+        sync_profile, per_account = self.profile_table.lookup(acct, cont)
         if sync_profile is None:
             return self.app(env, start_response)
-        # If mapping all containers, make a new profile for just this request
-        if sync_profile['container'] == '/*':
-            sync_profile = dict(sync_profile, container=cont.decode('utf-8'))
-            per_account = True
-        else:
-            per_account = False
 
         if not obj and req.method == 'GET':
-            return self.handle_listing(req, start_response, sync_profile, cont,
-                                       per_account)
+            return self._release_after(
+                req, self.handle_listing, start_response, sync_profile, cont,
+                per_account)
         elif obj and req.method in ('GET', 'HEAD'):
             # TODO: think about what to do for POST, COPY
-            return self.handle_object(req, start_response, sync_profile, obj,
-                                      per_account)
+            return self._release_after(
+                req, self.handle_object, start_response, sync_profile, obj,
+                per_account)
+        if obj:
+            # The object may be changing, so we can no longer rely on the
+            # cached remote metadata or listings
+            self.metadata_cache.invalidate(req.environ['PATH_INFO'])
+            self.listing_cache.invalidate(
+                (acct, cont), self._get_memcache(req))
         return self.app(env, start_response)
 
+    def _release_after(self, req, handler, *args):
+        """Calls the handler and releases the providers that it leased once
+        the response is closed.
+        """
+        leases = req.environ[PROVIDER_LEASES_KEY] = []
+        try:
+            app_iter = handler(req, *args)
+        except Exception:
+            _release_providers(leases)
+            raise
+        if not leases:
+            return app_iter
+        return LeasedIterable(app_iter, leases)
+
+    def _get_provider(self, req, sync_profile, max_conns, per_account):
+        table = self.profile_table
+        provider = table.get_provider(sync_profile, max_conns, per_account)
+        req.environ.setdefault(PROVIDER_LEASES_KEY, []).append(
+            (table, provider))
+        return provider
+
     def handle_listing(self, req, start_response, sync_profile, cont,
                        per_account):
         limit = int(req.params.get(
@@ -135,169 +376,649 @@ class S3SyncShunt(object):
         # We always make the request with the json format and convert to the
         # client-expected response.
         req.params = dict(req.params, format='json')
+        # List the remote store while the local listing is retrieved
+        provider = self._get_provider(
+            req, sync_profile, max_conns=1, per_account=per_account)
+        list_remote = functools.partial(
+            self._list_remote, provider,
+            (sync_profile['account'].encode('utf-8'), cont),
+            self._get_memcache(req))
+        remote_page = eventlet.spawn(
+            list_remote, marker, limit, prefix, delimiter)
         status, headers, app_iter = req.call_application(self.app)
         if not status.startswith('200 '):
             # Only splice 200 (since it's JSON, we know there won't be a 204)
+            remote_page.kill()
             start_response(status, headers)
             return app_iter
 
-        provider = create_provider(sync_profile, max_conns=1,
-                                   per_account=per_account)
-        cloud_status, resp = provider.list_objects(
-            marker, limit, prefix, delimiter)
-        if cloud_status != 200:
-            self.logger.error('Failed to list the remote store: %s' % resp)
-            resp = []
+        resp = remote_page.wait()
         if not resp:
             start_response(status, headers)
             return app_iter
 
-        internal_resp = json.load(utils.FileLikeIter(app_iter))
-        spliced_response = []
-        internal_index = 0
-        cloud_index = 0
-        while True:
-            if len(spliced_response) == limit:
-                break
+        entries = itertools.islice(
+            _merge_listings(
+                _iter_json_listing(app_iter),
+                self._iter_remote_listing(
+                    list_remote, resp, limit, prefix, delimiter)),
+            limit)
+        headers = [(header, value) for header, value in headers
+                   if header.lower() not in ('content-length',
+                                             'content-type')]
+        headers.append(('Content-Type', resp_type))
+        start_response(status, headers)
+        return self._format_listing_response(entries, resp_type, cont)
 
-            if len(resp) == cloud_index and \
-                    len(internal_resp) == internal_index:
-                break
+    def _get_memcache(self, req):
+        if not self.listing_memcache:
+            return None
+        return utils.cache_from_env(req.environ, True)
 
-            if internal_index < len(internal_resp):
-                if 'name' in internal_resp[internal_index]:
-                    internal_name = internal_resp[internal_index]['name']
-                elif 'subdir' in internal_resp[internal_index]:
-                    internal_name = internal_resp[internal_index]['subdir']
-            else:
-                internal_name = None
+    def _list_remote(self, provider, container, memcache, marker, limit,
+                     prefix, delimiter):
+        query = (marker, limit, prefix, delimiter)
+        page = self.listing_cache.get(container, query, memcache)
+        if page is not None:
+            return page
+        status, resp = provider.list_objects(*query)
+        if status != 200:
+            self.logger.error('Failed to list the remote store: %s' % resp)
+            return []
+        self.listing_cache.put(container, query, resp, memcache)
+        return resp
 
-            if cloud_index < len(resp):
-                if 'name' in resp[cloud_index]:
-                    cloud_name = resp[cloud_index]['name']
-                else:
-                    cloud_name = resp[cloud_index]['subdir']
-            else:
-                cloud_name = None
-
-            if cloud_name is not None:
-                if internal_name is None or \
-                        (internal_name is not None and
-                         cloud_name <= internal_name):
-                    spliced_response.append(resp[cloud_index])
-                    cloud_index += 1
-                    if len(resp) == cloud_index:
-                        # WSGI supplies the request parameters as UTF-8 encoded
-                        # strings. We should do the same when submitting
-                        # subsequent requests.
-                        cloud_status, resp = provider.list_objects(
-                            cloud_name.encode('utf-8'), limit, prefix,
-                            delimiter)
-                        if cloud_status != 200:
-                            self.logger.error(
-                                'Failed to list the remote store: %s' % resp)
-                            resp = []
-                        cloud_index = 0
+    def _iter_remote_listing(self, list_remote, page, limit, prefix,
+                             delimiter):
+        """Yields the entries of the remote listing, starting with the page.
+        The listing ends with an empty page.
+        """
+        next_page = None
+        try:
+            while page:
+                if len(page) < limit:
+                    # Most likely the last page: the next one is only
+                    # requested if the listing still needs more entries
+                    marker = _listing_name(page[-1]).encode('utf-8')
+                    for entry in page:
+                        yield entry
+                    page = list_remote(marker, limit, prefix, delimiter)
                     continue
-            spliced_response.append(internal_resp[internal_index])
-            internal_index += 1
-
-        res = self._format_listing_response(spliced_response, resp_type, cont)
-        dict_headers = dict(headers)
-        dict_headers['Content-Length'] = len(res)
-        dict_headers['Content-Type'] = resp_type
-        start_response(status, dict_headers.items())
-        return res
+                # Prefetch the next page while this one is merged.
+                # WSGI supplies the request parameters as UTF-8 encoded
+                # strings. We should do the same when submitting subsequent
+                # requests.
+                next_page = eventlet.spawn(
+                    list_remote, _listing_name(page[-1]).encode('utf-8'),
+                    limit, prefix, delimiter)
+                for entry in page:
+                    yield entry
+                page = next_page.wait()
+                next_page = None
+        finally:
+            if next_page is not None:
+                # The listing is complete (or the client went away)
+                next_page.kill()
 
     def handle_object(self, req, start_response, sync_profile, obj,
                       per_account):
+        speculative = None
+        if req.method == 'GET':
+            if self._is_archived(req, sync_profile, obj):
+                # The object is all but certain to 404 locally, so the remote
+                # GET is issued right away. The local object is still
+                # checked, as it may have been overwritten after it was
+                # archived.
+                self.logger.debug('%s is archived; shunting to %r'
+                                  % (req.path, sync_profile))
+                speculative = self._start_speculative_get(
+                    req, sync_profile, obj, per_account, 0)
+            elif sync_profile.get('speculative_get'):
+                speculative = self._start_speculative_get(
+                    req, sync_profile, obj, per_account,
+                    float(sync_profile.get('speculative_get_delay', 0)))
         status, headers, app_iter = req.call_application(self.app)
         if not status.startswith('404 '):
             # Only shunt 404s
+            if speculative:
+                self._abandon_speculative_get(speculative)
             start_response(status, headers)
             return app_iter
         self.logger.debug('404 for %s; shunting to %r'
                           % (req.path, sync_profile))
 
-        # Save off any existing trans-id headers so we can add them back later
+        # Save off any existing trans-id headers so we can add them back
+        # later
         trans_id_headers = [(h, v) for h, v in headers if h.lower() in (
             'x-trans-id', 'x-openstack-request-id')]
 
         utils.close_if_possible(app_iter)
 
-        provider = create_provider(sync_profile, max_conns=1,
-                                   per_account=per_account)
-        if req.method == 'GET' and sync_profile.get('restore_object', False):
-            # We incur an extra request hit by checking for a possible SLO.
-            manifest = provider.get_manifest(obj)
-            self.logger.debug("Manifest: %s" % manifest)
-            status_code, headers, app_iter = provider.shunt_object(req, obj)
-            put_headers = convert_to_local_headers(headers)
-
-            if response_is_complete(status_code, headers):
-                if check_slo(put_headers) and manifest:
-                    app_iter = SwiftSloPutWrapper(
-                        app_iter, put_headers, req.environ['PATH_INFO'],
-                        self.app, manifest, self.logger)
-                else:
-                    app_iter = SwiftPutWrapper(
-                        app_iter, put_headers, req.environ['PATH_INFO'],
-                        self.app, self.logger)
+        path = req.environ['PATH_INFO']
+        use_object_cache = not speculative and self._use_object_cache(
+            req, sync_profile)
+        if use_object_cache:
+            resp = self._get_cached_object(req, sync_profile, obj,
+                                           per_account)
+            if resp:
+                for header, value in trans_id_headers:
+                    resp.headers[header] = value
+                return resp(req.environ, start_response)
+
+        # Conditional and range requests always go to the remote store
+        cacheable = not any(header in req.headers
+                            for header in CONDITIONAL_HEADERS)
+        cached = self.metadata_cache.get(path) if cacheable else None
+        if speculative:
+            status_code, headers, app_iter = self._restore_object(
+                req, speculative[0], sync_profile, obj,
+                *self._finish_speculative_get(speculative))
+        elif cached and (cached[0] == 404 or req.method == 'HEAD'):
+            status_code, headers, body = cached
+            headers = list(headers)
+            app_iter = [body if req.method == 'GET' else '']
         else:
-            status_code, headers, app_iter = provider.shunt_object(req, obj)
+            provider = self._get_provider(
+                req, sync_profile, max_conns=self._get_max_conns(sync_profile),
+                per_account=per_account)
+            response = None
+            if self._use_segment_ranges(req, sync_profile):
+                response = self._get_slo_range(
+                    req, provider, sync_profile, obj)
+            if response:
+                status_code, headers, app_iter = response
+            elif req.method == 'GET':
+                fetch = functools.partial(self._get_remote_object,
+                                          req, provider, sync_profile, obj)
+                if any(header in req.headers
+                       for header in CONDITIONAL_HEADERS
+                       if header != 'Range'):
+                    # Conditional GETs may get different responses (such as
+                    # 304 or 412), so they are not coalesced
+                    status_code, headers, app_iter = fetch()
+                else:
+                    flight_key = (path, req.headers.get('Range'))
+                    status_code, headers, app_iter = \
+                        self.single_flight.fetch(flight_key, fetch)
+            else:
+                status_code, headers, app_iter = self._shunt_object(
+                    provider, sync_profile, req, obj)
+            if cacheable and status_code in (200, 404):
+                body = ''
+                if status_code == 404:
+                    # Error responses are small: keep the body to replay it
+                    body = ''.join(app_iter)
+                    utils.close_if_possible(app_iter)
+                    app_iter = [body]
+                self.metadata_cache.put(
+                    path, (status_code, list(headers), body))
         status = '%s %s' % (status_code, swob.RESPONSE_REASONS[status_code][0])
         self.logger.debug('Remote resp: %s' % status)
 
-        # Blacklist of known hop-by-hop headers taken from
-        # https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers
-        headers_to_remove = set([
-            'connection',
-            'keep-alive',
-            'proxy-authenticate',
-            'proxy-authorization',
-            'te',
-            'trailer',
-            'transfer-encoding',
-            'upgrade',
-        ])
         indexes_to_remove = [
             i for i, (header, key) in enumerate(headers)
-            if header.lower() in headers_to_remove]
+            if header.lower() in HOP_BY_HOP_HEADERS]
         headers = [item for i, item in enumerate(headers)
                    if i not in indexes_to_remove]
+        if use_object_cache and status_code == 200 and \
+                'Range' not in req.headers:
+            app_iter = self._cache_object(path, headers, app_iter)
         headers.extend(trans_id_headers)
 
         start_response(status, headers)
         return app_iter
 
+    def _use_object_cache(self, req, sync_profile):
+        # Restored objects are served by Swift instead
+        if not self.object_cache.enabled or req.method != 'GET' or \
+                not sync_profile.get('cache_objects', False) or \
+                sync_profile.get('restore_object', False):
+            return False
+        return not any(header in req.headers
+                       for header in CONDITIONAL_HEADERS
+                       if header != 'Range')
+
+    def _get_cached_object(self, req, sync_profile, obj, per_account):
+        """Returns the response for the cached object, if it matches the
+        object in the remote store.
+        """
+        path = req.environ['PATH_INFO']
+        cached = self.object_cache.open(path)
+        if cached is None:
+            return None
+        entry, reader = cached
+        metadata = self.metadata_cache.get(path)
+        if metadata and metadata[0] == 200:
+            status_code, headers, _ = metadata
+        else:
+            environ = dict(req.environ, REQUEST_METHOD='HEAD')
+            environ.pop('HTTP_RANGE', None)
+            provider = self._get_provider(
+                req, sync_profile, max_conns=self._get_max_conns(sync_profile),
+                per_account=per_account)
+            status_code, headers, app_iter = self._shunt_object(
+                provider, sync_profile, swob.Request(environ), obj)
+            utils.close_if_possible(app_iter)
+        if status_code != 200 or _get_etag(headers) != entry.etag:
+            reader.close()
+            self.object_cache.invalidate(path)
+            return None
+        return swob.Response(request=req, headers=entry.headers,
+                             app_iter=reader, conditional_response=True)
+
+    def _cache_object(self, path, headers, app_iter):
+        etag = _get_etag(headers)
+        size = next((value for header, value in headers
+                     if header.lower() == 'content-length'), None)
+        if etag is None or size is None:
+            return app_iter
+        return self.object_cache.writer(path, etag, list(headers), int(size),
+                                        app_iter)
+
+    @staticmethod
+    def _use_segment_ranges(req, sync_profile):
+        if not sync_profile.get('segment_ranges') and \
+                not sync_profile.get('restore_segments'):
+            return False
+        if req.method != 'GET' or 'Range' not in req.headers:
+            return False
+        return not any(header in req.headers
+                       for header in CONDITIONAL_HEADERS
+                       if header != 'Range')
+
+    def _get_slo_range(self, req, provider, sync_profile, obj):
+        """Serves a Range GET of an archived SLO from its segments. The
+        segments that are still in Swift are read locally and only the rest
+        of the range is retrieved from the remote store.
+
+        :returns: the response tuple, or None if the request cannot be served
+                  from the segments (e.g. the object is not an SLO).
+        """
+        path = req.environ['PATH_INFO']
+        cached = self.metadata_cache.get(path)
+        if cached:
+            status_code, headers, _ = cached
+            headers = list(headers)
+        else:
+            environ = dict(req.environ, REQUEST_METHOD='HEAD')
+            environ.pop('HTTP_RANGE', None)
+            status_code, headers, app_iter = self._shunt_object(
+                provider, sync_profile, swob.Request(environ), obj)
+            utils.close_if_possible(app_iter)
+            if status_code == 200:
+                self.metadata_cache.put(path, (status_code, list(headers), ''))
+        if status_code != 200 or \
+                not check_slo(convert_to_local_headers(headers)):
+            return None
+        etag = _get_etag(headers)
+        manifest = self._get_manifest(provider, path, obj, etag)
+        # Segments that are ranges of other objects are not supported
+        if not manifest or any('range' in segment for segment in manifest):
+            return None
+        size = sum(int(segment['bytes']) for segment in manifest)
+        ranges = req.range.ranges_for_length(size)
+        if not ranges or len(ranges) != 1:
+            return None
+        start, end = ranges[0]
+
+        headers = [(header, value) for header, value in headers
+                   if header.lower() not in ('content-length',
+                                             'content-range')]
+        headers.append(('Content-Length', str(end - start)))
+        headers.append(
+            ('Content-Range', 'bytes %d-%d/%d' % (start, end - 1, size)))
+        return 206, headers, self._iter_slo_range(
+            req, provider, sync_profile, obj, etag, manifest, start, end)
+
+    def _iter_slo_range(self, req, provider, sync_profile, obj, etag,
+                        manifest, start, end):
+        offset = 0
+        for segment in manifest:
+            segment_start = offset
+            offset += int(segment['bytes'])
+            if offset <= start:
+                continue
+            if segment_start >= end:
+                break
+            # The range to read, relative to the segment
+            first = max(start, segment_start) - segment_start
+            last = min(end, offset) - segment_start
+            body = self._get_local_segment(req, segment, first, last)
+            if body is None:
+                body = self._get_remote_segment(
+                    req, provider, sync_profile, obj, etag, segment,
+                    segment_start, first, last)
+            try:
+                for chunk in body:
+                    yield chunk
+            finally:
+                utils.close_if_possible(body)
+
+    @staticmethod
+    def _get_segment_path(req, segment):
+        # The manifest names are /<container>/<object>
+        name = segment['name']
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        return '/'.join(req.environ['PATH_INFO'].split('/', 3)[:3] +
+                        [name[1:]])
+
+    def _get_local_segment(self, req, segment, first, last):
+        seg_req = swob.Request.blank(
+            self._get_segment_path(req, segment),
+            environ={'swift.trans_id': req.environ.get('swift.trans_id')},
+            headers={'Range': 'bytes=%d-%d' % (first, last - 1)})
+        resp = seg_req.get_response(self.app)
+        # The segment may have been overwritten since
+        if resp.status_int not in (200, 206) or \
+                resp.headers.get('Etag', '').strip('"') != segment['hash'] or \
+                resp.content_length != last - first:
+            utils.close_if_possible(resp.app_iter)
+            return None
+        return resp.app_iter
+
+    def _get_remote_segment(self, req, provider, sync_profile, obj, etag,
+                            segment, segment_start, first, last):
+        segment_path = self._get_segment_path(req, segment)
+        restore = sync_profile.get('restore_segments') and \
+            segment_path not in self.restoring
+        if restore:
+            # Read the whole segment, in order to restore it
+            first_byte, last_byte = segment_start, \
+                segment_start + int(segment['bytes']) - 1
+        else:
+            first_byte, last_byte = segment_start + first, \
+                segment_start + last - 1
+        # Make sure all of the segments come from the same object
+        environ = dict(req.environ, HTTP_IF_MATCH=etag,
+                       HTTP_RANGE='bytes=%d-%d' % (first_byte, last_byte))
+        status_code, headers, body = self._shunt_object(
+            provider, sync_profile, swob.Request(environ), obj)
+        if status_code != 206:
+            utils.close_if_possible(body)
+            raise RuntimeError('Failed to read %s of %s: %d' % (
+                environ['HTTP_RANGE'], req.path, status_code))
+        if not restore:
+            return body
+
+        self.restoring.add(segment_path)
+        body = SwiftPutWrapper(
+            body, {'Etag': segment['hash']}, segment_path, self.app,
+            self.logger,
+            int(sync_profile.get('chunk_size', DEFAULT_CHUNK_SIZE)),
+            self.restore_pool,
+            functools.partial(self.restoring.discard, segment_path))
+        return _slice_body(body, first, last)
+
+    def _is_archived(self, req, sync_profile, obj):
+        if not sync_profile.get('archive_index', False):
+            return False
+        info = get_container_info(req.environ, self.app,
+                                  swift_source='S3SyncShunt')
+        return archive_index.is_archived(info.get('sysmeta', {}), obj)
+
+    @staticmethod
+    def _get_max_conns(sync_profile):
+        # Restoring an SLO requires a second connection to fetch the manifest
+        # while the object is being read, and hedged requests need their own
+        max_conns = 2 if sync_profile.get('restore_object') else 1
+        # Restored segments are read in full in the background
+        if sync_profile.get('restore_segments'):
+            max_conns += 1
+        if sync_profile.get('hedge_percentile'):
+            max_conns += 1
+        return max_conns
+
+    @staticmethod
+    def _shunt_object(provider, sync_profile, req, obj):
+        hedger = get_hedger(sync_profile)
+        if hedger is None:
+            return provider.shunt_object(req, obj)
+        return hedger.call(functools.partial(provider.shunt_object, req, obj))
+
+    def _start_speculative_get(self, req, sync_profile, obj, per_account,
+                               delay):
+        """Issues the remote GET while the object is retrieved from Swift
+        (after the delay, if set).
+
+        :returns: the provider, the green thread of the remote GET and the
+                  event that starts (True) or cancels (False) the GET before
+                  the delay expires.
+        """
+        provider = self._get_provider(
+            req, sync_profile, max_conns=self._get_max_conns(sync_profile),
+            per_account=per_account)
+        # The local request may change its environment
+        remote_req = swob.Request(dict(req.environ))
+        trigger = eventlet.event.Event()
+
+        def _get():
+            with eventlet.Timeout(delay, False):
+                if not trigger.wait():
+                    return None
+            return self._shunt_object(provider, sync_profile, remote_req, obj)
+        return provider, eventlet.spawn(_get), trigger
+
+    def _finish_speculative_get(self, speculative):
+        _, remote, trigger = speculative
+        if not trigger.ready():
+            trigger.send(True)
+        return remote.wait()
+
+    def _abandon_speculative_get(self, speculative):
+        _, remote, trigger = speculative
+        if not trigger.ready():
+            trigger.send(False)
+
+        def _close(thread):
+            try:
+                response = thread.wait()
+            except Exception:
+                return
+            if response:
+                utils.close_if_possible(response[2])
+        remote.link(_close)
+
+    def _get_remote_object(self, req, provider, sync_profile, obj):
+        return self._restore_object(req, provider, sync_profile, obj,
+                                    *self._shunt_object(
+                                        provider, sync_profile, req, obj))
+
+    def _restore_object(self, req, provider, sync_profile, obj, status_code,
+                        headers, app_iter):
+        """Restores the object into Swift as the response is read, if the
+        sync profile requires it.
+        """
+        path = req.environ['PATH_INFO']
+        if not sync_profile.get('restore_object', False) or \
+                path in self.restoring or \
+                not response_is_complete(status_code, headers):
+            return status_code, headers, app_iter
+
+        size = next((int(value) for header, value in headers
+                     if header.lower() == 'content-length'), None)
+        if size is None:
+            return status_code, headers, app_iter
+
+        put_headers = convert_to_local_headers(headers)
+        self.restoring.add(path)
+        manifest = None
+        if check_slo(put_headers):
+            # The manifest is only needed once the object has been read, so
+            # we fetch it while the object is streamed to the client.
+            manifest = eventlet.spawn(
+                self._get_manifest, provider, path, obj, _get_etag(headers))
+        # Objects that are too large to spool are streamed into Swift as
+        # they are returned to the client
+        streamed_size = size if size > self.restore_max_spool_size else None
+        app_iter = self._create_put_wrapper(
+            app_iter, put_headers, path, sync_profile, manifest,
+            streamed_size)
+        return status_code, headers, app_iter
+
+    def _create_put_wrapper(self, body, put_headers, path, sync_profile,
+                            manifest, size):
+        chunk_size = int(sync_profile.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        on_finish = functools.partial(self.restoring.discard, path)
+        if check_slo(put_headers):
+            return SwiftSloPutWrapper(
+                body, put_headers, path, self.app, manifest,
+                self.logger, chunk_size, self.restore_pool, on_finish,
+                segment_concurrency=self.segment_concurrency,
+                container_cache=self.segment_containers,
+                spool_dir=self.restore_spool_dir, size=size)
+        return SwiftPutWrapper(
+            body, put_headers, path, self.app, self.logger, chunk_size,
+            self.restore_pool, on_finish, spool_dir=self.restore_spool_dir,
+            size=size)
+
+    def _get_manifest(self, provider, path, obj, etag):
+        key = ('manifest', path, etag)
+        manifest = self.metadata_cache.get(key)
+        if manifest is None:
+            manifest = provider.get_manifest(obj)
+            self.logger.debug("Manifest: %s" % manifest)
+            if manifest:
+                self.metadata_cache.put(key, manifest)
+        return manifest
+
     @staticmethod
-    def _format_listing_response(list_results, list_format, container):
+    def _format_listing_response(entries, list_format, container):
+        """Serializes the listing entries as they are generated."""
         if list_format == 'application/json':
-            return json.dumps(list_results)
+            # Matches the output of json.dumps() for the whole list
+            separator = '['
+            for entry in entries:
+                yield separator + json.dumps(entry)
+                separator = ', '
+            yield '[]' if separator == '[' else ']'
+            return
+
         if list_format.endswith('/xml'):
-            fields = ['name', 'content_type', 'hash', 'bytes', 'last_modified',
-                      'subdir']
-            root = etree.Element('container', name=container)
-            for entry in list_results:
-                obj = etree.Element('object')
-                for f in fields:
-                    if f not in entry:
-                        continue
-                    el = etree.Element(f)
-                    text = entry[f]
-                    if type(text) == str:
-                        text = text.decode('utf-8')
-                    elif type(text) == int:
-                        text = str(text)
-                    el.text = text
-                    obj.append(el)
-                root.append(obj)
-            resp = etree.tostring(root, encoding='UTF-8', xml_declaration=True)
-            return resp.replace("<?xml version='1.0' encoding='UTF-8'?>",
-                                '<?xml version="1.0" encoding="UTF-8"?>', 1)
+            root = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+                '<container name=%s' % _xml_attribute(container)
+            for entry in entries:
+                if root:
+                    yield root + '>'
+                    root = None
+                yield _xml_listing_entry(entry)
+            if root:
+                yield root + '/>'
+            else:
+                yield '</container>'
+            return
 
         # Default to plain format
-        return '\n'.join([entry['name'] for entry in list_results])
+        separator = ''
+        for entry in entries:
+            name = _listing_name(entry)
+            if isinstance(name, unicode):
+                name = name.encode('utf-8')
+            yield separator + name
+            separator = '\n'
+
+
+def _slice_body(body, start, end):
+    """Returns the [start, end) range of the body."""
+    offset = 0
+    try:
+        for chunk in body:
+            chunk_start = offset
+            offset += len(chunk)
+            if offset <= start:
+                continue
+            yield chunk[max(start - chunk_start, 0):end - chunk_start]
+            if offset >= end:
+                break
+    finally:
+        utils.close_if_possible(body)
+
+
+def _listing_name(entry):
+    if 'name' in entry:
+        return entry['name']
+    return entry['subdir']
+
+
+XML_LISTING_FIELDS = ('name', 'content_type', 'hash', 'bytes',
+                      'last_modified', 'subdir')
+
+
+def _xml_text(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif not isinstance(value, str):
+        value = str(value)
+    return saxutils.escape(value, {'\r': '&#13;'})
+
+
+def _xml_attribute(value):
+    return '"%s"' % saxutils.escape(value, {
+        '"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+
+
+def _xml_listing_entry(entry):
+    return '<object>%s</object>' % ''.join(
+        '<%s>%s</%s>' % (field, _xml_text(entry[field]), field)
+        for field in XML_LISTING_FIELDS if field in entry)
+
+
+def _iter_json_listing(app_iter):
+    """Parses the entries of a JSON listing as its body is read."""
+    decoder = json.JSONDecoder()
+    chunks = iter(app_iter)
+    buf = ''
+    pos = 0
+    try:
+        while True:
+            while pos < len(buf) and buf[pos] in '[, \t\r\n':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            if pos < len(buf):
+                try:
+                    entry, pos = decoder.raw_decode(buf, pos)
+                    yield entry
+                    continue
+                except ValueError:
+                    # The entry may be split across chunks
+                    pass
+            chunk = next(chunks, None)
+            if chunk is None:
+                if pos < len(buf):
+                    raise ValueError('Truncated listing: %r' % buf[pos:])
+                return
+            buf = buf[pos:] + chunk
+            pos = 0
+    finally:
+        utils.close_if_possible(app_iter)
+
+
+def _merge_listings(local, remote):
+    """Merges two sorted listings. The local entry is returned for the names
+    that are in both listings.
+    """
+    local_entry = next(local, None)
+    remote_entry = next(remote, None)
+    while local_entry is not None or remote_entry is not None:
+        if remote_entry is None:
+            yield local_entry
+            local_entry = next(local, None)
+            continue
+        if local_entry is None:
+            yield remote_entry
+            remote_entry = next(remote, None)
+            continue
+        local_name = _listing_name(local_entry)
+        remote_name = _listing_name(remote_entry)
+        if remote_name < local_name:
+            yield remote_entry
+            remote_entry = next(remote, None)
+            continue
+        if remote_name == local_name:
+            remote_entry = next(remote, None)
+        yield local_entry
+        local_entry = next(local, None)
 
 
 def filter_factory(global_conf, **local_conf):
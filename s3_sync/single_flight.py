@@ -0,0 +1,181 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import eventlet
+
+from swift.common.utils import close_if_possible
+
+
+class FlightError(Exception):
+    pass
+
+
+class Flight(object):
+    """A single remote GET, whose response is shared by multiple clients.
+
+    The response body is read from the remote store by a separate green
+    thread and buffered, so that every client can consume it at its own
+    pace (and the remote read completes even if clients disconnect).
+    """
+    def __init__(self):
+        self.ready = eventlet.event.Event()
+        self.response = None
+        self.chunks = []
+        self.done = False
+        self.failed = False
+        self._changed = eventlet.event.Event()
+
+    def start(self, status, headers, body, on_done):
+        self.response = (status, headers)
+        self.ready.send(True)
+        eventlet.spawn_n(self._pump, body, on_done)
+
+    def cancel(self):
+        self.ready.send(False)
+
+    def join(self):
+        """Waits for the response to the remote request.
+
+        :returns: the (status, headers, body iterator) tuple, or None if the
+                  response cannot be shared.
+        """
+        if not self.ready.wait():
+            return None
+        status, headers = self.response
+        return status, list(headers), FlightReader(self)
+
+    def wait_for_change(self):
+        self._changed.wait()
+
+    def _notify(self):
+        changed = self._changed
+        self._changed = eventlet.event.Event()
+        changed.send()
+
+    def _pump(self, body, on_done):
+        try:
+            for chunk in body:
+                if chunk:
+                    self.chunks.append(chunk)
+                    self._notify()
+        except Exception:
+            self.failed = True
+        finally:
+            self.done = True
+            self._notify()
+            close_if_possible(body)
+            on_done()
+
+
+class FlightReader(object):
+    def __init__(self, flight):
+        self.flight = flight
+        self.index = 0
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while True:
+            if self.index < len(self.flight.chunks):
+                chunk = self.flight.chunks[self.index]
+                self.index += 1
+                return chunk
+            if self.flight.failed:
+                raise FlightError('Failed to read the remote object')
+            if self.flight.done:
+                raise StopIteration
+            self.flight.wait_for_change()
+
+
+class SingleFlight(object):
+    """Coalesces concurrent requests for the same remote object.
+
+    The first request for a key issues the remote request. Requests for the
+    same key that arrive while it is in progress wait for its response and
+    share the body. Only successful responses with a known length that is
+    no larger than max_size are shared, as the whole body is kept in memory
+    until every client has read it; otherwise, the waiting requests issue
+    their own remote requests.
+
+    The bodies that are buffered at any time, across all of the instances in
+    the process, are bounded by max_total bytes. Responses that do not fit
+    are not shared.
+    """
+    # Bytes reserved by the flights in progress in the process
+    buffered = 0
+
+    def __init__(self, max_size, max_total=64 * 2 ** 20):
+        self.max_size = max_size
+        self.max_total = max_total
+        self.flights = {}
+
+    def _get_length(self, status, headers):
+        """Returns the length of the body to buffer, or None if the response
+        cannot be shared.
+        """
+        if status not in (200, 206):
+            return None
+        length = next((value for header, value in headers
+                       if header.lower() == 'content-length'), None)
+        if length is None or int(length) > self.max_size:
+            return None
+        if SingleFlight.buffered + int(length) > self.max_total:
+            return None
+        return int(length)
+
+    def fetch(self, key, fetch_func):
+        """Returns the response for the key.
+
+        :param fetch_func: called to issue the remote request, returning the
+                           (status, headers, body iterator) tuple.
+        """
+        if not self.max_size:
+            return fetch_func()
+
+        flight = self.flights.get(key)
+        if flight:
+            response = flight.join()
+            if response:
+                return response
+            return fetch_func()
+
+        flight = Flight()
+        self.flights[key] = flight
+
+        def _remove():
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+        try:
+            status, headers, body = fetch_func()
+        except Exception:
+            _remove()
+            flight.cancel()
+            raise
+        length = self._get_length(status, headers)
+        if length is None:
+            _remove()
+            flight.cancel()
+            return status, headers, body
+        SingleFlight.buffered += length
+
+        def _done():
+            SingleFlight.buffered -= length
+            _remove()
+
+        flight.start(status, headers, body, _done)
+        return flight.join()
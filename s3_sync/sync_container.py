@@ -26,6 +26,7 @@ from swift.common.internal_client import UnexpectedResponse
 import time
 
 import container_crawler.base_sync
+from .archive_index import BloomFilter, HEADER_PREFIX
 from .provider_factory import create_provider
 from container_crawler import RetryError, SkipContainer
 
@@ -51,6 +52,10 @@ class SyncContainer(container_crawler.base_sync.BaseSync):
         self.copy_after = int(sync_settings.get('copy_after', 0))
         self.retain_local = sync_settings.get('retain_local', True)
         self.propagate_delete = sync_settings.get('propagate_delete', True)
+        # Record the objects removed from the container in its metadata
+        self.archive_index = sync_settings.get('archive_index', False)
+        self._archived = set()
+        self._swift_client = None
         self.provider = create_provider(sync_settings, max_conns,
                                         per_account=self._per_account)
 
@@ -79,6 +84,8 @@ class SyncContainer(container_crawler.base_sync.BaseSync):
                 return 0
 
     def save_last_row(self, row, db_id):
+        if self._archived:
+            self._update_archive_index(db_id)
         if not os.path.exists(self._status_account_dir):
             os.mkdir(self._status_account_dir)
         if not os.path.exists(self._status_file):
@@ -133,3 +140,28 @@ class SyncContainer(container_crawler.base_sync.BaseSync):
                 except UnexpectedResponse as e:
                     if '409 Conflict' in e.message:
                         pass
+                else:
+                    if self.archive_index:
+                        self._archived.add(row['name'])
+                        self._swift_client = swift_client
+
+    def _update_archive_index(self, db_id):
+        key = HEADER_PREFIX + db_id
+        try:
+            metadata = self._swift_client.get_container_metadata(
+                self._account, self._container, metadata_prefix=HEADER_PREFIX)
+            value = metadata.get(db_id.lower())
+            index = BloomFilter.deserialize(value) if value else BloomFilter()
+            if index.saturated:
+                # The index is no longer used by the shunt
+                self._archived = set()
+                return
+            for name in self._archived:
+                index.add(name)
+            self._swift_client.set_container_metadata(
+                self._account, self._container, {key: index.serialize()})
+            self._archived = set()
+        except Exception:
+            # The names are added on the next attempt
+            self.logger.exception('Failed to update the archive index of %s/%s'
+                                  % (self._account, self._container))
@@ -46,6 +46,9 @@ class SyncS3(BaseSync):
     CLOUD_SYNC_VERSION = '5.0'
     GOOGLE_UA_STRING = 'CloudSync/%s (GPN:SwiftStack)' % CLOUD_SYNC_VERSION
     SLO_MANIFEST_SUFFIX = '.swift_slo_manifest'
+    # Error codes used by S3 and S3-clones when the request rate is too high
+    THROTTLE_ERROR_CODES = ('SlowDown', 'Throttling', 'ThrottlingException',
+                            'RequestLimitExceeded', 'TooManyRequests')
 
     def _is_amazon(self):
         return not self.endpoint or self.endpoint.endswith('amazonaws.com')
@@ -91,6 +94,15 @@ class SyncS3(BaseSync):
             return s3_client
         return boto_client_factory
 
+    def _is_throttle_error(self, error):
+        if not isinstance(error, botocore.exceptions.ClientError):
+            return False
+        if error.response.get('Error', {}).get('Code') in \
+                self.THROTTLE_ERROR_CODES:
+            return True
+        resp_meta = error.response.get('ResponseMetadata', {})
+        return resp_meta.get('HTTPStatusCode') in self.THROTTLE_STATUSES
+
     def upload_object(self, swift_key, storage_policy_index, internal_client):
         s3_key = self.get_s3_name(swift_key)
         try:
@@ -130,12 +142,15 @@ class SyncS3(BaseSync):
                 self.update_metadata(swift_key, metadata)
                 return
 
-        with self.client_pool.get_client() as s3_client:
+        with self.client_pool.get_client(data=True) as s3_client:
             wrapper_stream = FileWrapper(internal_client,
                                          self.account,
                                          self.container,
                                          swift_key,
-                                         swift_req_hdrs)
+                                         swift_req_hdrs,
+                                         rate_limiter=self.rate_limiter,
+                                         spool_size=self.spool_size,
+                                         chunk_size=self.chunk_size)
             self.logger.debug('Uploading %s with meta: %r' % (
                 s3_key, wrapper_stream.get_s3_headers()))
 
@@ -149,7 +164,10 @@ class SyncS3(BaseSync):
             )
             if self._is_amazon() and self.encryption:
                 params['ServerSideEncryption'] = 'AES256'
-            s3_client.put_object(**params)
+            try:
+                s3_client.put_object(**params)
+            finally:
+                wrapper_stream.close()
 
     def _delete_not_found(self, s3_key):
         '''Deletes the object and ignores the 404 Not Found error.'''
@@ -256,20 +274,25 @@ class SyncS3(BaseSync):
                 return ProviderResponse(False, 502, {}, iter('Bad Gateway'))
 
         if op == 'get_object':
-            entry = self.client_pool.get_client()
+            entry = self.client_pool.get_client(data=True)
             resp = _perform_op(entry.client)
+            entry.record_status(resp.status)
             if resp.success:
                 resp.body = ClosingResourceIterable(
                     entry,
                     resp.body,
+                    read_chunk=self.chunk_size,
                     length=int(resp.headers['Content-Length']))
             else:
                 resp.body = ClosingResourceIterable(
                     entry, resp.body, lambda: None)
             return resp
         else:
-            with self.client_pool.get_client() as s3_client:
-                return _perform_op(s3_client)
+            entry = self.client_pool.get_client()
+            with entry as s3_client:
+                resp = _perform_op(s3_client)
+                entry.record_status(resp.status)
+                return resp
 
     def list_objects(self, marker, limit, prefix, delimiter=None,
                      native=False):
@@ -404,9 +427,10 @@ class SyncS3(BaseSync):
     def _upload_google_slo(self, manifest, metadata, s3_key, req_hdrs,
                            internal_client):
 
-        with self.client_pool.get_client() as s3_client:
+        with self.client_pool.get_client(data=True) as s3_client:
             slo_wrapper = SLOFileWrapper(
-                internal_client, self.account, manifest, metadata, req_hdrs)
+                internal_client, self.account, manifest, metadata, req_hdrs,
+                rate_limiter=self.rate_limiter, chunk_size=self.chunk_size)
             s3_client.put_object(Bucket=self.aws_bucket,
                                  Key=s3_key,
                                  Body=slo_wrapper,
@@ -521,19 +545,25 @@ class SyncS3(BaseSync):
                 part_number, segment = work
                 container, obj = segment['name'].split('/', 2)[1:]
 
-                with self.client_pool.get_client() as s3_client:
+                with self.client_pool.get_client(data=True) as s3_client:
                     self.logger.debug('Uploading part %d from %s: %s bytes' % (
                         part_number, self.account + segment['name'],
                         segment['bytes']))
                     wrapper = FileWrapper(internal_client, self.account,
-                                          container, obj, req_headers)
-                    resp = s3_client.upload_part(
-                        Bucket=self.aws_bucket,
-                        Body=wrapper,
-                        Key=s3_key,
-                        ContentLength=len(wrapper),
-                        UploadId=upload_id,
-                        PartNumber=part_number)
+                                          container, obj, req_headers,
+                                          rate_limiter=self.rate_limiter,
+                                          spool_size=self.spool_size,
+                                          chunk_size=self.chunk_size)
+                    try:
+                        resp = s3_client.upload_part(
+                            Bucket=self.aws_bucket,
+                            Body=wrapper,
+                            Key=s3_key,
+                            ContentLength=len(wrapper),
+                            UploadId=upload_id,
+                            PartNumber=part_number)
+                    finally:
+                        wrapper.close()
                     if not self.check_etag(segment['hash'], resp['ETag']):
                         self.logger.error('Part %d ETag mismatch (%s): %s %s' %
                                           (part_number,
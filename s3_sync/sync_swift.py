@@ -65,6 +65,10 @@ class SyncSwift(BaseSync):
                 os_options=os_options)
         return swift_client_factory
 
+    def _is_throttle_error(self, error):
+        return isinstance(error, swiftclient.exceptions.ClientException) and \
+            error.http_status in self.THROTTLE_STATUSES
+
     def upload_object(self, name, policy, internal_client):
         if self._per_account and not self.verified_container:
             with self.client_pool.get_client() as swift_client:
@@ -126,22 +130,30 @@ class SyncSwift(BaseSync):
                 self.update_metadata(name, metadata)
             return
 
-        with self.client_pool.get_client() as swift_client:
+        with self.client_pool.get_client(data=True) as swift_client:
             wrapper_stream = FileWrapper(internal_client,
                                          self.account,
                                          self.container,
                                          name,
-                                         swift_req_hdrs)
+                                         swift_req_hdrs,
+                                         rate_limiter=self.rate_limiter,
+                                         spool_size=self.spool_size,
+                                         chunk_size=self.chunk_size)
             headers = self._get_user_headers(wrapper_stream.get_headers())
             self.logger.debug('Uploading %s with meta: %r' % (
                 name, headers))
 
-            swift_client.put_object(self.remote_container,
-                                    name,
-                                    wrapper_stream,
-                                    etag=wrapper_stream.get_headers()['etag'],
-                                    headers=headers,
-                                    content_length=len(wrapper_stream))
+            try:
+                swift_client.put_object(
+                    self.remote_container,
+                    name,
+                    wrapper_stream,
+                    etag=wrapper_stream.get_headers()['etag'],
+                    headers=headers,
+                    content_length=len(wrapper_stream),
+                    chunk_size=self.chunk_size)
+            finally:
+                wrapper_stream.close()
 
     def delete_object(self, name, internal_client=None):
         """Delete an object from the remote cluster.
@@ -187,7 +199,7 @@ class SyncSwift(BaseSync):
 
         if req.method == 'GET':
             resp = self.get_object(
-                name, resp_chunk_size=65536, headers=headers)
+                name, resp_chunk_size=self.chunk_size, headers=headers)
         elif req.method == 'HEAD':
             resp = self.head_object(name, headers=headers)
         else:
@@ -259,8 +271,9 @@ class SyncSwift(BaseSync):
                 return ProviderResponse(False, 502, {}, iter('Bad Gateway'))
 
         if op == 'get_object' and 'resp_chunk_size' in args:
-            entry = self.client_pool.get_client()
+            entry = self.client_pool.get_client(data=True)
             resp = _perform_op(entry.client)
+            entry.record_status(resp.status)
             if resp.success:
                 resp.body = ClosingResourceIterable(
                     entry, resp.body, resp.body.resp.close)
@@ -269,8 +282,11 @@ class SyncSwift(BaseSync):
                     entry, resp.body, lambda: None)
             return resp
         else:
-            with self.client_pool.get_client() as swift_client:
-                return _perform_op(swift_client)
+            entry = self.client_pool.get_client()
+            with entry as swift_client:
+                resp = _perform_op(swift_client)
+                entry.record_status(resp.status)
+                return resp
 
     def list_objects(self, marker, limit, prefix, delimiter=None):
         try:
@@ -376,15 +392,19 @@ class SyncSwift(BaseSync):
     def _upload_segment(self, segment, req_headers, internal_client):
         container, obj = segment['name'].split('/', 2)[1:]
         dest_container = self.remote_container + '_segments'
-        with self.client_pool.get_client() as swift_client:
+        with self.client_pool.get_client(data=True) as swift_client:
             wrapper = FileWrapper(internal_client, self.account, container,
-                                  obj, req_headers)
+                                  obj, req_headers,
+                                  rate_limiter=self.rate_limiter,
+                                  spool_size=self.spool_size,
+                                  chunk_size=self.chunk_size)
             self.logger.debug('Uploading segment %s: %s bytes' % (
                 self.account + segment['name'], segment['bytes']))
             try:
                 swift_client.put_object(dest_container, obj, wrapper,
                                         etag=segment['hash'],
-                                        content_length=len(wrapper))
+                                        content_length=len(wrapper),
+                                        chunk_size=self.chunk_size)
             except swiftclient.exceptions.ClientException as e:
                 # The segments may not exist, so we need to create it
                 if e.http_status == 404:
@@ -395,6 +415,8 @@ class SyncSwift(BaseSync):
                     # iteration
                     swift_client.put_container(dest_container)
                     raise RuntimeError('Missing segments container')
+            finally:
+                wrapper.close()
 
     @staticmethod
     def _is_meta_synced(local_metadata, remote_metadata):
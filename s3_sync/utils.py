@@ -15,13 +15,17 @@ limitations under the License.
 """
 
 import eventlet
+import eventlet.queue
 import hashlib
 import json
 import StringIO
+import tempfile
 import urllib
 
 from swift.common.swob import Request
-from swift.common.utils import FileLikeIter, close_if_possible
+from swift.common.utils import close_if_possible
+
+from .limits import get_spool_dir, release_spool, reserve_spool
 
 
 SWIFT_USER_META_PREFIX = 'x-object-meta-'
@@ -30,54 +34,197 @@ MANIFEST_HEADER = 'x-object-manifest'
 SLO_HEADER = 'x-static-large-object'
 SLO_ETAG_FIELD = 'swift-slo-etag'
 SWIFT_TIME_FMT = '%Y-%m-%dT%H:%M:%S.%f'
+# Default size of the chunks we read from (and pass on to) the object stores.
+# Can be raised with the "chunk_size" setting for fast links.
+DEFAULT_CHUNK_SIZE = 65536
 
 
 class FileWrapper(object):
-    def __init__(self, swift_client, account, container, key, headers={}):
+    # Number of times we try to resume the stream if reading from Swift fails
+    # part way through the object
+    MAX_RESUME_ATTEMPTS = 3
+
+    def __init__(self, swift_client, account, container, key, headers={},
+                 rate_limiter=None, spool_size=0,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        """Wraps a Swift object as a file-like object for uploads.
+
+        If spool_size is set, objects up to that size are read from Swift
+        once and buffered (subject to the process-wide spool limit), so that
+        retries and seeks do not re-read the object from Swift. The wrapper
+        must be closed to release the buffer. The object is read (and
+        iterated) in chunk_size chunks.
+        """
         self._swift = swift_client
+        self.chunk_size = chunk_size
         self._account = account
         self._container = container
         self._key = key
         self.swift_req_hdrs = headers
+        self._rate_limiter = rate_limiter
         self._bytes_read = 0
+        self._headers = None
+        self._etag = None
+        self._spool = None
         self.open_object_stream()
+        if (spool_size and self.__len__() <= spool_size and
+                reserve_spool(self.__len__())):
+            self._spool_object()
+
+    def _spool_object(self):
+        spool_dir = get_spool_dir()
+        if spool_dir:
+            spool = tempfile.TemporaryFile(dir=spool_dir)
+        else:
+            spool = StringIO.StringIO()
+        try:
+            while True:
+                # Reading from Swift does not use the remote bandwidth
+                data = self._read_object(self.chunk_size, rate_limited=False)
+                if not data:
+                    break
+                spool.write(data)
+        except:
+            spool.close()
+            release_spool(self.__len__())
+            raise
+        spool.seek(0)
+        self._spool = spool
+        self._bytes_read = 0
 
-    def open_object_stream(self):
-        status, self._headers, body = self._swift.get_object(
+    def open_object_stream(self, offset=0):
+        """Opens the object stream at the given offset.
+
+        Once the object has been opened, any subsequent requests (e.g. when
+        seeking) carry If-Match with the original ETag, so that we never
+        splice together the contents of different versions of the object.
+        The headers (and the length) always refer to the whole object.
+        """
+        req_headers = dict(self.swift_req_hdrs)
+        if self._etag:
+            req_headers['If-Match'] = self._etag
+        if offset:
+            req_headers['Range'] = 'bytes=%d-' % offset
+        status, headers, body = self._swift.get_object(
             self._account, self._container, self._key,
-            headers=self.swift_req_hdrs)
-        if status != 200:
+            headers=req_headers)
+        if status != (206 if offset else 200):
+            close_if_possible(body)
             raise RuntimeError('Failed to get the object')
-        self._bytes_read = 0
+        if self._headers is None:
+            self._headers = headers
+            self._etag = next((value for key, value in headers.items()
+                               if key.lower() == 'etag'), None)
+            self._s3_headers = convert_to_s3_headers(self._headers)
+        self._bytes_read = offset
         self._swift_stream = body
-        self._iter = FileLikeIter(body)
-        self._s3_headers = convert_to_s3_headers(self._headers)
+        self._body_iter = iter(body)
+        # The chunk we are currently returning data from. We hand out the
+        # chunks (or slices of them) as they are, rather than copying them
+        # into an intermediate buffer.
+        self._chunk = ''
+        self._chunk_offset = 0
+
+    def _next_chunk(self):
+        if self._chunk_offset < len(self._chunk):
+            return
+        self._chunk = ''
+        self._chunk_offset = 0
+        for chunk in self._body_iter:
+            if chunk:
+                self._chunk = chunk
+                return
+
+    def _read_stream(self, size):
+        self._next_chunk()
+        if size < 0:
+            data = ''.join(
+                [self._chunk[self._chunk_offset:]] + list(self._body_iter))
+            self._chunk = ''
+            self._chunk_offset = 0
+            return data
+        if self._chunk_offset == 0 and size >= len(self._chunk):
+            data = self._chunk
+        else:
+            data = self._chunk[self._chunk_offset:self._chunk_offset + size]
+        self._chunk_offset += len(data)
+        return data
+
+    def _read_with_resume(self, read_func, arg):
+        attempts = 0
+        while True:
+            try:
+                result = read_func(arg)
+                if not result:
+                    raise RuntimeError('Object stream ended at %d bytes' %
+                                       self._bytes_read)
+                return result
+            except Exception:
+                attempts += 1
+                if attempts > self.MAX_RESUME_ATTEMPTS:
+                    raise
+                self._resume()
+
+    def _advance(self, count, rate_limited=True):
+        self._bytes_read += count
+        if self._rate_limiter and rate_limited:
+            self._rate_limiter.consume_bytes(count)
+        if self._bytes_read == self.__len__():
+            # Older Swift releases only complete the request once the body
+            # iterator is exhausted (fixed by
+            # https://review.openstack.org/#/c/363199/). Running the iterator
+            # to the end does not copy any data.
+            next(self._body_iter, None)
+            self._swift_stream.close()
+
+    def _resume(self):
+        try:
+            self._swift_stream.close()
+        except Exception:
+            pass
+        self.open_object_stream(self._bytes_read)
 
     def tell(self):
         return self._bytes_read
 
     def seek(self, pos, flag=0):
-        if pos != 0:
-            raise RuntimeError('Arbitrary seeks are not supported')
-        if self._bytes_read == 0:
+        if flag == 1:
+            pos += self._bytes_read
+        elif flag == 2:
+            pos += self.__len__()
+        if pos < 0 or pos > self.__len__():
+            raise RuntimeError('Invalid seek offset: %d' % pos)
+        if self._spool is not None:
+            self._spool.seek(pos)
+            self._bytes_read = pos
+            return
+        if pos == self._bytes_read:
             return
         self._swift_stream.close()
-        self.open_object_stream()
+        if pos == self.__len__():
+            self._bytes_read = pos
+            return
+        self.open_object_stream(pos)
 
     def reset(self, *args, **kwargs):
         self.seek(0)
 
     def read(self, size=-1):
-        if self._bytes_read == self.__len__():
+        if self._spool is not None:
+            data = self._spool.read(size)
+            self._bytes_read += len(data)
+            # The retries served from the spool are also paced
+            if self._rate_limiter:
+                self._rate_limiter.consume_bytes(len(data))
+            return data
+        return self._read_object(size)
+
+    def _read_object(self, size, rate_limited=True):
+        if self._bytes_read == self.__len__() or size == 0:
             return ''
 
-        data = self._iter.read(size)
-        self._bytes_read += len(data)
-        # TODO: we do not need to read an extra byte after
-        # https://review.openstack.org/#/c/363199/ is released
-        if self._bytes_read == self.__len__():
-            self._iter.read(1)
-            self._swift_stream.close()
+        data = self._read_with_resume(self._read_stream, size)
+        self._advance(len(data), rate_limited)
         return data
 
     def __len__(self):
@@ -86,7 +233,7 @@ class FileWrapper(object):
         return int(self._headers['Content-Length'])
 
     def __iter__(self):
-        return self._iter
+        return iter(lambda: self.read(self.chunk_size), '')
 
     def get_s3_headers(self):
         return self._s3_headers
@@ -95,6 +242,11 @@ class FileWrapper(object):
         return self._headers
 
     def close(self):
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+            release_spool(self.__len__())
+            return
         self._swift_stream.close()
 
 
@@ -109,11 +261,13 @@ class SLOFileWrapper(object):
     # For the headers, we must also attach the Swift manifest ETag, as we have
     # no way of verifying the object has been uploaded otherwise.
     def __init__(self, swift_client, account, manifest, manifest_meta,
-                 headers={}):
+                 headers={}, rate_limiter=None, chunk_size=DEFAULT_CHUNK_SIZE):
         self._swift = swift_client
+        self._chunk_size = chunk_size
         self._manifest = manifest
         self._account = account
         self._swift_req_headers = headers
+        self._rate_limiter = rate_limiter
         self._s3_headers = convert_to_s3_headers(manifest_meta)
         self._s3_headers[SLO_ETAG_FIELD] = manifest_meta['etag']
         self._segment = None
@@ -136,7 +290,9 @@ class SLOFileWrapper(object):
         segment = self._manifest[self._segment_index]
         container, key = segment['name'].split('/', 2)[1:]
         self._segment = FileWrapper(self._swift, self._account, container,
-                                    key, self._swift_req_headers)
+                                    key, self._swift_req_headers,
+                                    self._rate_limiter,
+                                    chunk_size=self._chunk_size)
         self._segment_index += 1
 
     def read(self, size=-1):
@@ -164,71 +320,47 @@ class SLOFileWrapper(object):
         return self._s3_headers
 
 
-class BlobstorePutWrapper(object):
-    def __init__(self, chunk_size, chunk_queue):
-        self.chunk_size = chunk_size
-        self.queue = chunk_queue
-
-        self.chunk = None
-        self.chunk_offset = 0
-        self.closed = False
-
-    def read(self, size=-1):
-        if self.closed:
-            return ''
-        if size == -1 or size > self.chunk_size:
-            size = self.chunk_size
-        resp = ''
-        while size:
-            if size < 0:
-                raise RuntimeError('Negative chunk size')
-            if self.chunk == '':
-                self.closed = True
-                break
-            if not self.chunk or self.chunk_offset == len(self.chunk):
-                self.chunk = self.queue.get()
-                self.chunk_offset = 0
-
-            read_sz = min(size, len(self.chunk) - self.chunk_offset)
-            new_offset = self.chunk_offset + read_sz
-            resp += self.chunk[self.chunk_offset:new_offset]
-            size -= read_sz
-            self.chunk_offset = new_offset
-        return resp
-
-    def close(self):
-        self.closed = True
-        if self.chunk:
-            self.chunk = None
-            self.chunk_offset = 0
-        return
-
-
 class SwiftPutWrapper(object):
-    CHUNK_SIZE = 65536
+    """Restores the object into Swift while it is returned to the client.
+
+    The data is spilled into a temporary file as the client reads it. Once
+    the whole object has been read, it is PUT into Swift in the background,
+    so that the client is never slowed down by the local PUT. If the client
+    disconnects early, the rest of the object is read from the remote store
+    in the background before restoring it.
+
+    Objects that are too large to spool are instead streamed into Swift as
+    the client reads them, when their size is given. The restore is then
+    abandoned if the client disconnects early or if the local PUT falls too
+    far behind the client.
+    """
+    # Chunks that the streamed PUT may fall behind the client
+    MAX_PENDING_CHUNKS = 64
 
-    def __init__(self, body, headers, path, app, logger):
+    def __init__(self, body, headers, path, app, logger,
+                 chunk_size=DEFAULT_CHUNK_SIZE, pool=None, on_finish=None,
+                 spool_dir=None, size=None):
         self.body = body
         self.app = app
         self.headers = headers
         self.path = path
         self.logger = logger
-        self.queue = eventlet.queue.Queue(maxsize=15)
-        self.put_wrapper = BlobstorePutWrapper(self.CHUNK_SIZE, self.queue)
-        self.put_thread = eventlet.greenthread.spawn(
-            self._create_put_request().get_response, self.app)
-
-    def _create_put_request(self):
-        env = {'REQUEST_METHOD': 'PUT',
-               'wsgi.input': self.put_wrapper}
-        return Request.blank(
-            self.path,
-            environ=env,
-            headers=self.headers)
+        self.chunk_size = chunk_size
+        self.pool = pool
+        # Called once the restore completes (or is abandoned)
+        self.on_finish = on_finish
+        # Size of the streamed object (None if the object is spooled)
+        self.size = size
+        if size is None:
+            self.spool = tempfile.TemporaryFile(dir=spool_dir)
+        else:
+            self.spool = ChunkPipe(self.MAX_PENDING_CHUNKS)
+        self.started = False
+        self.finished = False
 
     def _read_chunk(self, size):
-        if size == -1 or size > self.CHUNK_SIZE:
-            size = self.CHUNK_SIZE
+        if size == -1 or size > self.chunk_size:
+            size = self.chunk_size
         if hasattr(self.body, 'read'):
             chunk = self.body.read(size)
         else:
@@ -238,40 +370,263 @@ class SwiftPutWrapper(object):
                 chunk = ''
         return chunk
 
-    def _wait_for_put(self):
-        resp = self.put_thread.wait()
+    def _spawn(self, func):
+        """Runs the function in the restore pool, unless the pool is full.
+
+        :returns: whether the function was spawned.
+        """
+        if not self.pool:
+            eventlet.spawn_n(func)
+            return True
+        # Spawning into a full pool would block the client's response
+        if not self.pool.free():
+            if self.logger:
+                self.logger.warning(
+                    'Too many restores in progress; not restoring %s' %
+                    self.path)
+            return False
+        self.pool.spawn_n(func)
+        return True
+
+    def _abort(self):
+        self.finished = True
+        self.spool.close()
+        close_if_possible(self.body)
+        if self.on_finish:
+            self.on_finish()
+
+    def _drain(self):
+        try:
+            while True:
+                chunk = self._read_chunk(self.chunk_size)
+                if not chunk:
+                    break
+                self.spool.write(chunk)
+        except Exception:
+            if self.logger:
+                self.logger.warning(
+                    'Failed to read the object %s to restore it' % self.path)
+            self._abort()
+            return
+        self._restore()
+
+    def _restore(self):
+        close_if_possible(self.body)
+        try:
+            size = self.spool.tell()
+            self.spool.seek(0)
+            self._put_object(size)
+        except Exception:
+            if self.logger:
+                self.logger.exception(
+                    'Failed to restore the object %s' % self.path)
+        finally:
+            self.spool.close()
+            if self.on_finish:
+                self.on_finish()
+
+    def _start_streamed(self):
+        self.started = True
+        if not self._spawn(self._restore_streamed):
+            # The object is still returned to the client
+            self.spool.close()
+            if self.on_finish:
+                self.on_finish()
+
+    def _restore_streamed(self):
+        try:
+            self._put_object(self.size)
+        except Exception:
+            if self.logger:
+                self.logger.exception(
+                    'Failed to restore the object %s' % self.path)
+        finally:
+            # The rest of the object is no longer passed on
+            self.spool.close()
+            if self.on_finish:
+                self.on_finish()
+
+    def _put_object(self, size):
+        env = {'REQUEST_METHOD': 'PUT',
+               'wsgi.input': self.spool,
+               'CONTENT_LENGTH': size}
+        req = Request.blank(self.path, environ=env, headers=self.headers)
+        resp = req.get_response(self.app)
         if not resp.is_success and self.logger:
             self.logger.warning(
-                'Failed to restore the object: %d' % resp.status)
+                'Failed to restore the object: %d' % resp.status_int)
         close_if_possible(resp.app_iter)
-        return resp
 
     def read(self, size=-1):
-        chunk = self._read_chunk(size)
-        self.queue.put(chunk)
-        if not chunk:
-            self._wait_for_put()
+        if self.finished:
+            return ''
+        if self.size is not None and not self.started:
+            self._start_streamed()
+        try:
+            chunk = self._read_chunk(size)
+        except Exception:
+            self._abort()
+            raise
+        if chunk:
+            self.spool.write(chunk)
+        else:
+            self.finished = True
+            if self.size is not None:
+                self.spool.finish()
+                close_if_possible(self.body)
+            elif not self._spawn(self._restore):
+                self._abort()
         return chunk
 
+    def close(self):
+        if self.finished:
+            return
+        if self.size is not None:
+            # Without the client, the streamed object is not read any further
+            if self.started:
+                self.finished = True
+                self.spool.close()
+                close_if_possible(self.body)
+            else:
+                self._abort()
+            return
+        self.finished = True
+        if not self._spawn(self._drain):
+            self._abort()
+
     def __iter__(self):
         return self
 
     def next(self):
-        chunk = self.read(self.CHUNK_SIZE)
+        chunk = self.read(self.chunk_size)
         if not chunk:
             raise StopIteration
         return chunk
 
 
+class ChunkPipe(object):
+    """Passes the chunks written to it to a reader in another green thread.
+
+    Writes never block: if the reader falls more than max_chunks behind, the
+    pipe is closed. Once the pipe is closed, writes are ignored and the
+    reader fails, unless the pipe was finished first.
+    """
+    def __init__(self, max_chunks):
+        self.max_chunks = max_chunks
+        self.queue = eventlet.queue.LightQueue()
+        self.closed = False
+        self.broken = False
+        self.reader = BodyReader(self._iter_chunks())
+
+    def write(self, chunk):
+        if self.closed:
+            return
+        if self.queue.qsize() >= self.max_chunks:
+            self.close()
+            return
+        self.queue.put(chunk)
+
+    def finish(self):
+        """Ends the data once the reader gets the pending chunks."""
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+
+    def close(self):
+        if not self.closed:
+            self.broken = True
+            self.finish()
+
+    def _iter_chunks(self):
+        while True:
+            chunk = self.queue.get()
+            if self.broken:
+                raise IOError('The object was not read in full')
+            if chunk is None:
+                return
+            yield chunk
+
+    def read(self, size=-1):
+        return self.reader.read(size)
+
+
+class BodyReader(object):
+    """File-like object that reads a response body iterator.
+
+    Every byte is copied at most once: the chunks are returned as they are
+    when they fit in the read and the pieces of a read are joined once.
+    """
+    def __init__(self, body):
+        self.body = iter(body)
+        self.chunk = ''
+        self.offset = 0
+
+    def read(self, size=-1):
+        pieces = []
+        while size != 0:
+            if self.offset >= len(self.chunk):
+                self.chunk = next(self.body, None)
+                self.offset = 0
+                if self.chunk is None:
+                    self.chunk = ''
+                    break
+                continue
+            if self.offset == 0 and (size < 0 or len(self.chunk) <= size):
+                piece = self.chunk
+            elif size < 0:
+                piece = self.chunk[self.offset:]
+            else:
+                piece = self.chunk[self.offset:self.offset + size]
+            self.offset += len(piece)
+            pieces.append(piece)
+            if size > 0:
+                size -= len(piece)
+        if len(pieces) == 1:
+            return pieces[0]
+        return ''.join(pieces)
+
+
+class SegmentReader(object):
+    """Reads at most length bytes from the file-like object.
+
+    If an offset is given, the reader seeks to its position before every
+    read, so that several readers can share the file.
+    """
+    def __init__(self, fileobj, length, offset=None):
+        self.fileobj = fileobj
+        self.remainder = length
+        self.offset = offset
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remainder:
+            size = self.remainder
+        if self.offset is not None:
+            self.fileobj.seek(self.offset)
+        data = self.fileobj.read(size)
+        self.remainder -= len(data)
+        if self.offset is not None:
+            self.offset += len(data)
+        return data
+
+
 class SwiftSloPutWrapper(SwiftPutWrapper):
-    def __init__(self, body, headers, path, app, manifest, logger):
-        self.manifest = manifest
-        self.segment_index = 0
-        self.remainder = self.manifest[0]['bytes']
-        self.failed = False
+    """Restores an SLO, given its manifest.
 
+    The manifest may also be supplied as a green thread that returns it.
+    The segments are uploaded concurrently (up to segment_concurrency at a
+    time). The segment containers that are known to exist can be cached in
+    container_cache, shared by the restores.
+    """
+    def __init__(self, body, headers, path, app, manifest, logger,
+                 chunk_size=DEFAULT_CHUNK_SIZE, pool=None, on_finish=None,
+                 segment_concurrency=1, container_cache=None, spool_dir=None,
+                 size=None):
+        self.manifest = manifest
+        self.segment_concurrency = segment_concurrency
+        self.container_cache = container_cache
         super(SwiftSloPutWrapper, self).__init__(
-            body, headers, path, app, logger)
+            body, headers, path, app, logger, chunk_size, pool, on_finish,
+            spool_dir, size)
 
     def _create_request_path(self, target):
         # The path is /<version>/<account>/<container>/<object>. We strip off
@@ -281,32 +636,76 @@ class SwiftSloPutWrapper(SwiftPutWrapper):
         parts.append(target)
         return '/'.join(parts)
 
-    def _ensure_segments_container(self):
+    def _ensure_segments_container(self, container):
+        path = self._create_request_path(container)
+        if self.container_cache is not None and self.container_cache.get(path):
+            return True
         env = {'REQUEST_METHOD': 'PUT'}
-        segment_path = self.manifest[self.segment_index]['name']
-        container_path = segment_path.split('/', 2)[1]
-        req = Request.blank(
-            # The manifest path is /<container>/<object>
-            self._create_request_path(container_path),
-            environ=env)
+        req = Request.blank(path, environ=env)
         resp = req.get_response(self.app)
+        close_if_possible(resp.app_iter)
         if not resp.is_success:
-            self.failed = True
             if self.logger:
                 self.logger.warning(
                     'Failed to create the segment container %s: %s' % (
-                        container_path, resp.status))
-        close_if_possible(resp.app_iter)
+                        container, resp.status))
+            return False
+        if self.container_cache is not None:
+            self.container_cache.put(path, True)
+        return True
 
-    def _create_put_request(self):
-        self._ensure_segments_container()
+    def _put_segment(self, segment, offset):
         env = {'REQUEST_METHOD': 'PUT',
-               'wsgi.input': self.put_wrapper,
-               'CONTENT_LENGTH': self.manifest[self.segment_index]['bytes']}
-        return Request.blank(
-            self._create_request_path(
-                self.manifest[self.segment_index]['name'][1:]),
-            environ=env)
+               'wsgi.input': SegmentReader(
+                   self.spool, segment['bytes'], offset),
+               'CONTENT_LENGTH': segment['bytes']}
+        req = Request.blank(
+            self._create_request_path(segment['name'][1:]), environ=env)
+        resp = req.get_response(self.app)
+        close_if_possible(resp.app_iter)
+        if not resp.is_success:
+            if self.logger:
+                self.logger.warning(
+                    'Failed to restore segment %s: %s' % (
+                        segment['name'], resp.status))
+            return False
+        return True
+
+    def _put_object(self, size):
+        if hasattr(self.manifest, 'wait'):
+            # The manifest is being fetched by a separate green thread
+            self.manifest = self.manifest.wait()
+        if not self.manifest:
+            # Without the manifest, we can only restore the whole object
+            super(SwiftSloPutWrapper, self)._put_object(size)
+            return
+        if size != sum([int(segment['bytes']) for segment in self.manifest]):
+            if self.logger:
+                self.logger.warning(
+                    'Size of %s does not match the manifest' % self.path)
+            return
+        containers = set()
+        offsets = []
+        offset = 0
+        for segment in self.manifest:
+            container = segment['name'].split('/', 2)[1]
+            if container not in containers:
+                if not self._ensure_segments_container(container):
+                    return
+                containers.add(container)
+            offsets.append(offset)
+            offset += int(segment['bytes'])
+        if self.size is not None:
+            # The body is streamed, so the segments are read in order
+            for segment in self.manifest:
+                if not self._put_segment(segment, None):
+                    return
+        else:
+            segment_pool = eventlet.GreenPool(self.segment_concurrency)
+            if not all(list(segment_pool.imap(
+                    self._put_segment, self.manifest, offsets))):
+                return
+        self._upload_manifest()
 
     def _upload_manifest(self):
         SLO_FIELD_MAP = {
@@ -348,44 +747,6 @@ class SwiftSloPutWrapper(SwiftPutWrapper):
                     self.path, resp.status))
         close_if_possible(resp.app_iter)
 
-    def read(self, size=-1):
-        chunk = self._read_chunk(size)
-        # On failure, we pass through the data and abort the attempt to restore
-        # into the object store.
-        if self.failed:
-            return chunk
-
-        if self.remainder - len(chunk) >= 0:
-            self.remainder -= len(chunk)
-            self.queue.put(chunk)
-        else:
-            if self.remainder > 0:
-                self.queue.put(chunk[:self.remainder])
-            self.queue.put('')
-            resp = self._wait_for_put()
-            if not resp.is_success:
-                if self.logger:
-                    self.logger.warning(
-                        'Failed to restore segment %s: %s' % (
-                            self.manifest[self.segment_index]['name'],
-                            resp.status))
-                self.failed = True
-                return chunk
-
-            self.segment_index += 1
-            self.put_wrapper = BlobstorePutWrapper(self.CHUNK_SIZE, self.queue)
-            self.put_thread = eventlet.greenthread.spawn(
-                self._create_put_request().get_response, self.app)
-            self.queue.put(chunk[self.remainder:])
-            segment_length = self.manifest[self.segment_index]['bytes']
-            self.remainder = segment_length - (len(chunk) - self.remainder)
-
-        if not chunk:
-            self._wait_for_put()
-            # Upload the manifest
-            self._upload_manifest()
-        return chunk
-
 
 class ClosingResourceIterable(object):
     """
@@ -393,7 +754,7 @@ class ClosingResourceIterable(object):
         data is consumed.
     """
     def __init__(self, resource, data_src, close_callable=None,
-                 read_chunk=65536, length=None):
+                 read_chunk=DEFAULT_CHUNK_SIZE, length=None):
         self.closed = False
         self.exhausted = False
         self.data_src = data_src
@@ -524,7 +885,8 @@ def get_slo_etag(manifest):
 def check_slo(swift_meta):
     if SLO_HEADER not in swift_meta:
         return False
-    return swift_meta[SLO_HEADER].lower() == 'true'
+    # The S3 provider sets the header to True for multipart uploads
+    return str(swift_meta[SLO_HEADER]).lower() == 'true'
 
 
 def response_is_complete(status_code, headers):
@@ -22,5 +22,6 @@ setup(name='swift-s3-sync',
           ],
           'paste.filter_factory': [
               'cloud-shunt = s3_sync.shunt:filter_factory',
+              'cloud-journal = s3_sync.journal:filter_factory',
           ],
       })
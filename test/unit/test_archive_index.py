@@ -0,0 +1,78 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from s3_sync.archive_index import BloomFilter, is_archived
+import unittest
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_add(self):
+        index = BloomFilter()
+        names = ['object-%d' % i for i in range(1000)]
+        for name in names:
+            index.add(name)
+        index.add(u'unicod\xe9')
+        for name in names:
+            self.assertIn(name, index)
+        self.assertIn(u'unicod\xe9', index)
+        self.assertIn('unicod\xc3\xa9', index)
+        false_positives = sum(1 for i in range(1000)
+                              if 'other-%d' % i in index)
+        self.assertLess(false_positives, 10)
+
+    def test_serialize(self):
+        index = BloomFilter(size=16, hashes=3)
+        index.add('foo')
+        index.add('foo')
+        self.assertEqual(1, index.count)
+        copy = BloomFilter.deserialize(index.serialize())
+        self.assertEqual(3, copy.hashes)
+        self.assertEqual(1, copy.count)
+        self.assertEqual(index.bits, copy.bits)
+        self.assertIn('foo', copy)
+
+    def test_saturated(self):
+        index = BloomFilter(size=16, hashes=3)
+        self.assertEqual(13, index.capacity)
+        for i in range(index.capacity):
+            index.add('object-%d' % i)
+        self.assertLessEqual(index.count, index.capacity)
+        self.assertFalse(index.saturated)
+        index.count = index.capacity + 1
+        self.assertTrue(index.saturated)
+
+
+class TestIsArchived(unittest.TestCase):
+    def test_is_archived(self):
+        first = BloomFilter()
+        first.add('foo')
+        second = BloomFilter()
+        second.add('bar')
+        sysmeta = {'shunt-archive-index-db1': first.serialize(),
+                   'shunt-archive-index-db2': second.serialize(),
+                   'other': 'value'}
+        self.assertTrue(is_archived(sysmeta, 'foo'))
+        self.assertTrue(is_archived(sysmeta, 'bar'))
+        self.assertFalse(is_archived(sysmeta, 'baz'))
+        self.assertFalse(is_archived({}, 'foo'))
+
+    def test_ignores_invalid_and_saturated(self):
+        index = BloomFilter()
+        index.add('foo')
+        index.count = index.capacity + 1
+        sysmeta = {'shunt-archive-index-db1': index.serialize(),
+                   'shunt-archive-index-db2': 'garbage'}
+        self.assertFalse(is_archived(sysmeta, 'foo'))
@@ -16,6 +16,7 @@ limitations under the License.
 
 import mock
 from s3_sync.base_sync import BaseSync
+from s3_sync import limits
 import unittest
 
 
@@ -37,3 +38,64 @@ class TestBaseSync(unittest.TestCase):
             self.assertEqual(
                 0, base.client_pool.client_pool[0].semaphore.balance)
         self.assertEqual(1, base.client_pool.get_semaphore.balance)
+
+    @mock.patch('s3_sync.base_sync.BaseSync._get_client_factory')
+    def test_endpoint_limiter(self, factory_mock):
+        factory_mock.return_value = mock.Mock()
+        limits.configure_limits({'endpoint_control_conns': 2,
+                                 'endpoint_data_conns': 1})
+        try:
+            first = BaseSync(self.settings, max_conns=2)
+            second = BaseSync(self.settings, max_conns=2)
+            limiter = first.client_pool.endpoint_limiter
+            self.assertIs(limiter, second.client_pool.endpoint_limiter)
+
+            with first.client_pool.get_client(data=True):
+                self.assertEqual(0, limiter.data.balance)
+                with second.client_pool.get_client():
+                    self.assertEqual(1, limiter.control.balance)
+                    self.assertEqual(0, limiter.data.balance)
+                self.assertEqual(2, limiter.control.balance)
+            self.assertEqual(1, limiter.data.balance)
+            self.assertEqual(2, first.client_pool.free_count())
+        finally:
+            limits.configure_limits({})
+
+    @mock.patch('s3_sync.base_sync.BaseSync._is_throttle_error')
+    @mock.patch('s3_sync.base_sync.BaseSync._get_client_factory')
+    def test_adaptive_endpoint_limiter(self, factory_mock, throttle_mock):
+        factory_mock.return_value = mock.Mock()
+        throttle_mock.side_effect = lambda error: isinstance(
+            error, RuntimeError)
+        limits.configure_limits({'endpoint_data_conns': 4,
+                                 'adaptive_concurrency': True})
+        try:
+            base = BaseSync(self.settings, max_conns=2)
+            limiter = base.client_pool.endpoint_limiter.data
+
+            with self.assertRaises(RuntimeError):
+                with base.client_pool.get_client(data=True):
+                    raise RuntimeError('slow down')
+            self.assertEqual(2, limiter.limit)
+
+            entry = base.client_pool.get_client(data=True)
+            entry.record_status(200)
+            entry.close()
+            self.assertEqual(2.5, limiter.limit)
+
+            # Other errors do not shrink the limit
+            with self.assertRaises(ValueError):
+                with base.client_pool.get_client(data=True):
+                    raise ValueError('not found')
+            self.assertEqual(2.9, limiter.limit)
+
+            with mock.patch('s3_sync.limits.time.time') as time_mock:
+                time_mock.return_value = limiter.last_backoff + 10
+                entry = base.client_pool.get_client(data=True)
+                entry.record_status(503)
+                entry.close()
+            self.assertEqual(1.45, limiter.limit)
+            self.assertEqual(0, limiter.in_flight)
+            self.assertEqual(2, base.client_pool.free_count())
+        finally:
+            limits.configure_limits({})
@@ -0,0 +1,108 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import mock
+from s3_sync.cache import LRUCache, ListingCache
+import unittest
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2, 60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+    @mock.patch('s3_sync.cache.time.time')
+    def test_expires(self, time_mock):
+        time_mock.return_value = 100
+        cache = LRUCache(2, 10)
+        cache.put('a', 1)
+        time_mock.return_value = 109
+        self.assertEqual(1, cache.get('a'))
+        time_mock.return_value = 110
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+    def test_invalidate(self):
+        cache = LRUCache(2, 60)
+        cache.put('a', 1)
+        cache.invalidate('a')
+        cache.invalidate('b')
+        self.assertIsNone(cache.get('a'))
+
+    def test_disabled(self):
+        cache = LRUCache(0, 60)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+class FakeMemcache(object):
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, serialize=True, time=0):
+        self.store[key] = value
+
+
+class TestListingCache(unittest.TestCase):
+    def test_invalidate(self):
+        cache = ListingCache(10, 60)
+        query = ('', 10000, '', '')
+        cache.put(('a', 'c'), query, [{'name': 'foo'}])
+        cache.put(('a', 'other'), query, [])
+        self.assertEqual([{'name': 'foo'}], cache.get(('a', 'c'), query))
+        self.assertIsNone(cache.get(('a', 'c'), ('foo', 10000, '', '')))
+
+        cache.invalidate(('a', 'c'))
+        self.assertIsNone(cache.get(('a', 'c'), query))
+        self.assertEqual([], cache.get(('a', 'other'), query))
+
+    def test_evicted_generation(self):
+        cache = ListingCache(1, 60)
+        query = ('', 10000, '', '')
+        cache.put(('a', 'c'), query, [{'name': 'foo'}])
+        # Evicts the generation of the first container
+        cache.generations.put(('a', 'other'), 0)
+        self.assertIsNone(cache.get(('a', 'c'), query))
+
+    def test_memcache(self):
+        memcache = FakeMemcache()
+        cache = ListingCache(0, 10)
+        query = ('', 10000, '', '')
+        cache.put(('a', 'c'), query, [{'name': 'foo'}], memcache)
+        self.assertEqual([{'name': 'foo'}],
+                         cache.get(('a', 'c'), query, memcache))
+        # Another proxy shares the cached pages and their invalidation
+        other_cache = ListingCache(0, 10)
+        self.assertEqual([{'name': 'foo'}],
+                         other_cache.get(('a', 'c'), query, memcache))
+        other_cache.invalidate(('a', 'c'), memcache)
+        self.assertIsNone(cache.get(('a', 'c'), query, memcache))
+
+    def test_disabled(self):
+        cache = ListingCache(0, 10)
+        query = ('', 10000, '', '')
+        cache.put(('a', 'c'), query, [{'name': 'foo'}])
+        self.assertIsNone(cache.get(('a', 'c'), query))
@@ -0,0 +1,136 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from container_crawler import ContainerCrawler
+
+from s3_sync.crawler import SyncCrawler
+
+
+class TestSyncCrawler(unittest.TestCase):
+    @mock.patch.object(ContainerCrawler, '__init__', return_value=None)
+    def setUp(self, init_mock):
+        self.status_dir = tempfile.mkdtemp()
+        self.conf = {'containers': [
+            {'account': 'AUTH_a', 'container': 'c1'},
+            {'account': 'AUTH_a', 'container': 'c2'},
+            {'account': 'AUTH_b', 'container': '/*'}],
+            'journal_dir': '/journal',
+            'db_watch': True,
+            'status_dir': self.status_dir}
+        self.crawler = SyncCrawler(self.conf, mock.Mock())
+        self.crawler.journal = mock.Mock()
+        self.crawled = []
+        self.crawler.run_once = lambda: self.crawled.append(
+            list(self.crawler.conf['containers']))
+
+    def tearDown(self):
+        shutil.rmtree(self.status_dir)
+
+    def test_run_journaled(self):
+        self.crawler.journal.read.return_value = set([
+            ('AUTH_a', 'c1'), ('AUTH_b', 'c3'), ('AUTH_c', 'c1')])
+        self.crawler.run_journaled()
+        self.assertEqual([[{'account': 'AUTH_a', 'container': 'c1'},
+                           {'account': 'AUTH_b', 'container': '/*'}]],
+                         self.crawled)
+        self.assertEqual(3, len(self.conf['containers']))
+
+        self.crawler.journal.read.return_value = set()
+        self.crawler.run_journaled()
+        self.assertEqual(1, len(self.crawled))
+
+    def test_run_changed(self):
+        db_dir = os.path.join(self.status_dir, 'dbs')
+        os.mkdir(db_dir)
+        self.crawler._get_db_paths = lambda account, container: [
+            os.path.join(db_dir, container + '.db')]
+        self.crawler.signatures = self.crawler._get_signatures()
+        self.assertEqual(
+            [('AUTH_a', 'c1'), ('AUTH_a', 'c2')],
+            sorted(self.crawler.signatures.keys()))
+
+        # Nothing changed
+        self.crawler.run_changed()
+        self.assertEqual([], self.crawled)
+
+        with open(os.path.join(db_dir, 'c1.db.pending'), 'w') as fp:
+            fp.write('update')
+        self.crawler.run_changed()
+        self.assertEqual([[{'account': 'AUTH_a', 'container': 'c1'}]],
+                         self.crawled)
+        self.assertEqual(3, len(self.conf['containers']))
+
+        # Changes to the sync status of a container
+        os.mkdir(os.path.join(self.status_dir, 'AUTH_a'))
+        with open(os.path.join(self.status_dir, 'AUTH_a', 'c2'), 'w') as fp:
+            fp.write('{"last_row": 1}')
+        self.crawler.run_changed()
+        self.assertEqual([{'account': 'AUTH_a', 'container': 'c2'}],
+                         self.crawled[-1])
+
+        self.crawler.run_changed()
+        self.assertEqual(2, len(self.crawled))
+
+    def test_run_accounts(self):
+        self.crawler.run_accounts()
+        self.assertEqual([[{'account': 'AUTH_b', 'container': '/*'}]],
+                         self.crawled)
+        self.assertEqual(3, len(self.conf['containers']))
+
+    @mock.patch('s3_sync.crawler.time')
+    def test_run_always_db_watch(self, time_mock):
+        clock = [0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+            if clock[0] >= 20:
+                raise StopIteration
+
+        time_mock.time.side_effect = lambda: clock[0]
+        time_mock.sleep.side_effect = sleep
+        self.crawler.journal = None
+        self.crawler.poll_interval = 5
+        self.crawler.full_crawl_interval = 15
+        self.crawler._get_signatures = lambda: {}
+        with self.assertRaises(StopIteration):
+            self.crawler.run_always()
+        all_mappings = self.conf['containers']
+        accounts = [{'account': 'AUTH_b', 'container': '/*'}]
+        # The accounts are crawled every poll_interval between the full
+        # crawls
+        self.assertEqual([all_mappings, accounts, accounts, accounts,
+                          all_mappings], self.crawled)
+
+    @mock.patch('s3_sync.crawler.Ring')
+    def test_get_db_paths(self, ring_mock):
+        ring_mock.return_value.get_nodes.return_value = (
+            5, [{'device': 'sda'}, {'device': 'sdb'}])
+        paths = self.crawler._get_db_paths('AUTH_a', 'c1')
+        ring_mock.assert_called_once_with('/etc/swift', ring_name='container')
+        self.assertEqual(2, len(paths))
+        self.assertTrue(paths[0].startswith('/srv/node/sda/containers/5/'))
+        self.assertTrue(paths[1].startswith('/srv/node/sdb/containers/5/'))
+
+        self.crawler._ring = None
+        self.conf['devices'] = '/devices'
+        paths = self.crawler._get_db_paths('AUTH_a', 'c1')
+        self.assertTrue(paths[0].startswith('/devices/sda/containers/5/'))
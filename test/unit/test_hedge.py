@@ -0,0 +1,140 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import eventlet
+import eventlet.event
+import mock
+from s3_sync import hedge
+import unittest
+
+
+class TestHedger(unittest.TestCase):
+    def setUp(self):
+        self.bodies = [mock.Mock(), mock.Mock()]
+        self.delays = [0, 0]
+        self.calls = 0
+
+    def request(self):
+        index = self.calls
+        self.calls += 1
+        eventlet.sleep(self.delays[index])
+        if isinstance(self.bodies[index], Exception):
+            raise self.bodies[index]
+        return 200, [], self.bodies[index]
+
+    def _make_hedger(self, budget=1):
+        hedger = hedge.Hedger(95, budget)
+        hedger.latencies.extend([0.001] * hedge.MIN_SAMPLES)
+        return hedger
+
+    def test_no_samples(self):
+        hedger = hedge.Hedger(95, 1)
+        self.assertIsNone(hedger.delay())
+        self.delays[0] = 0.01
+        self.assertEqual((200, [], self.bodies[0]),
+                         hedger.call(self.request))
+        self.assertEqual(1, self.calls)
+        self.assertEqual(1, len(hedger.latencies))
+
+    def test_delay(self):
+        hedger = hedge.Hedger(90, 1, min_delay=0.005)
+        hedger.latencies.extend([0.001 * i for i in range(1, 101)])
+        self.assertAlmostEqual(0.091, hedger.delay())
+        hedger.min_delay = 0.5
+        self.assertEqual(0.5, hedger.delay())
+
+    def test_fast_response(self):
+        hedger = self._make_hedger()
+        self.assertEqual((200, [], self.bodies[0]),
+                         hedger.call(self.request))
+        self.assertEqual(1, self.calls)
+
+    def test_hedged(self):
+        hedger = self._make_hedger()
+        self.delays[0] = 0.05
+        self.assertEqual((200, [], self.bodies[1]),
+                         hedger.call(self.request))
+        self.assertEqual(2, self.calls)
+        # The slower response is closed once it arrives
+        self.bodies[0].close.assert_not_called()
+        eventlet.sleep(0.1)
+        self.bodies[0].close.assert_called_once_with()
+        self.bodies[1].close.assert_not_called()
+
+    def test_budget(self):
+        hedger = self._make_hedger(budget=0.5)
+        # The first request does not complete until the hedger has decided
+        # not to hedge it (or until the hedged request completed), so that
+        # the test does not depend on timing
+        decisions = []
+        release = []
+        take_token = hedger._take_token
+
+        def _take_token():
+            hedged = take_token()
+            decisions.append(hedged)
+            if not hedged:
+                release[-1].send()
+            return hedged
+
+        def request():
+            index = self.calls
+            self.calls += 1
+            if index == 0:
+                release[-1].wait()
+            return 200, [], self.bodies[index]
+
+        with mock.patch.object(hedger, '_take_token', _take_token):
+            release.append(eventlet.event.Event())
+            self.assertEqual((200, [], self.bodies[0]),
+                             hedger.call(request))
+            # Not enough budget for a hedged request
+            self.assertEqual([False], decisions)
+            self.assertEqual(1, self.calls)
+
+            self.calls = 0
+            release.append(eventlet.event.Event())
+            self.assertEqual((200, [], self.bodies[1]),
+                             hedger.call(request))
+            self.assertEqual([False, True], decisions)
+            self.assertEqual(2, self.calls)
+
+        # Let the slower request complete
+        release[-1].send()
+
+    def test_failed_request(self):
+        hedger = self._make_hedger()
+        self.delays[0] = 0.01
+        self.bodies[1] = RuntimeError('failed')
+        self.assertEqual((200, [], self.bodies[0]),
+                         hedger.call(self.request))
+
+        self.calls = 0
+        hedger.tokens = 1
+        self.bodies[0] = RuntimeError('also failed')
+        with self.assertRaises(RuntimeError):
+            hedger.call(self.request)
+        self.assertEqual(2, self.calls)
+
+    def test_get_hedger(self):
+        settings = {'account': 'AUTH_a', 'aws_bucket': 'bucket'}
+        self.assertIsNone(hedge.get_hedger(settings))
+        settings['hedge_percentile'] = '99'
+        hedger = hedge.get_hedger(settings)
+        self.assertEqual(99, hedger.percentile)
+        self.assertEqual(0.1, hedger.budget)
+        self.assertIs(hedger, hedge.get_hedger(
+            dict(settings, container='other')))
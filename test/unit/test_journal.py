@@ -0,0 +1,147 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from swift.common import swob
+
+from s3_sync import journal
+
+
+class FakeApp(object):
+    def __init__(self, status='201 Created'):
+        self.status = status
+
+    def __call__(self, env, start_response):
+        start_response(self.status, [])
+        return ['']
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.journal_dir = tempfile.mkdtemp()
+        self.conf = {'containers': [
+            {'account': 'AUTH_a', 'container': 'c1'},
+            {'account': 'AUTH_b', 'container': '/*'}]}
+        with tempfile.NamedTemporaryFile(delete=False) as fp:
+            json.dump(self.conf, fp)
+        self.conf_file = fp.name
+
+    def tearDown(self):
+        shutil.rmtree(self.journal_dir)
+        os.unlink(self.conf_file)
+
+    def _make_app(self, app):
+        return journal.filter_factory(
+            {'conf_file': self.conf_file,
+             'journal_dir': self.journal_dir})(app)
+
+    def _read_records(self):
+        records = []
+        for name in sorted(os.listdir(self.journal_dir)):
+            with open(os.path.join(self.journal_dir, name)) as fp:
+                records.extend(json.loads(line) for line in fp)
+        return records
+
+    def test_journal_changes(self):
+        app = self._make_app(FakeApp())
+        for method, path in (('PUT', '/v1/AUTH_a/c1/o1'),
+                             ('DELETE', '/v1/AUTH_b/c2/o2'),
+                             ('POST', '/v1/AUTH_a/c1/o3'),
+                             # not journaled
+                             ('GET', '/v1/AUTH_a/c1/o1'),
+                             ('PUT', '/v1/AUTH_a/c2/o1'),
+                             ('PUT', '/v1/AUTH_a/c1'),
+                             ('PUT', '/v1/AUTH_c/c1/o1')):
+            req = swob.Request.blank(
+                path, environ={'REQUEST_METHOD': method,
+                               'HTTP_X_TIMESTAMP': '1500000000.00000'})
+            self.assertEqual('201 Created', req.get_response(app).status)
+        self.assertEqual(
+            [{'account': 'AUTH_a', 'container': 'c1', 'object': 'o1',
+              'timestamp': '1500000000.00000', 'op': 'PUT'},
+             {'account': 'AUTH_b', 'container': 'c2', 'object': 'o2',
+              'timestamp': '1500000000.00000', 'op': 'DELETE'},
+             {'account': 'AUTH_a', 'container': 'c1', 'object': 'o3',
+              'timestamp': '1500000000.00000', 'op': 'POST'}],
+            self._read_records())
+
+    def test_failed_requests_not_journaled(self):
+        app = self._make_app(FakeApp('503 Service Unavailable'))
+        req = swob.Request.blank('/v1/AUTH_a/c1/o1',
+                                 environ={'REQUEST_METHOD': 'PUT'})
+        self.assertEqual(503, req.get_response(app).status_int)
+        self.assertEqual([], self._read_records())
+
+    def test_journal_errors_ignored(self):
+        app = self._make_app(FakeApp())
+        req = swob.Request.blank('/v1/AUTH_a/c1/o1',
+                                 environ={'REQUEST_METHOD': 'PUT'})
+        with mock.patch.object(app.writer, 'append') as append_mock:
+            append_mock.side_effect = OSError('failed')
+            self.assertEqual(201, req.get_response(app).status_int)
+        append_mock.assert_called_once_with(mock.ANY)
+
+    @mock.patch('s3_sync.journal.time.time')
+    def test_read_journal(self, time_mock):
+        writer = journal.JournalWriter(self.journal_dir)
+        reader = journal.JournalReader(self.journal_dir)
+        time_mock.return_value = 100
+        writer.append({'account': 'AUTH_a', 'container': 'c1'})
+        writer.append({'account': 'AUTH_a', 'container': 'c1'})
+        time_mock.return_value = 101
+        writer.append({'account': 'AUTH_b', 'container': 'c2'})
+        with open(os.path.join(self.journal_dir,
+                               '100-1.journal'), 'w') as fp:
+            fp.write('{"account": "AUTH_a", "container": "c3"}\n{"acc')
+        # The files may still be written to
+        self.assertEqual(set(), reader.read())
+
+        time_mock.return_value = 102
+        self.assertEqual(set([('AUTH_a', 'c1'), ('AUTH_a', 'c3')]),
+                         reader.read())
+        time_mock.return_value = 103
+        self.assertEqual(set([('AUTH_b', 'c2')]), reader.read())
+        self.assertEqual([], os.listdir(self.journal_dir))
+        writer.close()
+
+    @mock.patch('s3_sync.journal.time.time')
+    def test_journal_bounds(self, time_mock):
+        writer = journal.JournalWriter(self.journal_dir, max_files=2,
+                                       max_file_size=100)
+        record = {'account': 'AUTH_a', 'container': 'c1'}
+        time_mock.return_value = 100
+        self.assertTrue(writer.append(record))
+        self.assertTrue(writer.append(record))
+        # The file is full
+        self.assertFalse(writer.append(record))
+        time_mock.return_value = 101
+        self.assertTrue(writer.append(record))
+        # No new files while the journal holds max_files files
+        time_mock.return_value = 102
+        self.assertFalse(writer.append(record))
+        self.assertEqual(2, len(os.listdir(self.journal_dir)))
+        writer.close()
+
+    def test_read_missing_journal(self):
+        reader = journal.JournalReader(
+            os.path.join(self.journal_dir, 'missing'))
+        self.assertEqual(set(), reader.read())
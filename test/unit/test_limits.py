@@ -0,0 +1,202 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import eventlet
+import mock
+import time
+from s3_sync import limits
+import unittest
+
+
+class TestAdaptiveSemaphore(unittest.TestCase):
+    def test_fixed_limit(self):
+        sem = limits.AdaptiveSemaphore(2)
+        sem.acquire()
+        sem.backoff()
+        self.assertEqual(1, sem.balance)
+        sem.release()
+        sem.grow()
+        self.assertEqual(2, sem.balance)
+
+    @mock.patch('s3_sync.limits.time.time')
+    def test_backoff(self, time_mock):
+        time_mock.return_value = 100
+        sem = limits.AdaptiveSemaphore(8, adaptive=True)
+        sem.backoff()
+        self.assertEqual(4, sem.balance)
+        # Throttling responses for requests already in flight are ignored
+        sem.backoff()
+        self.assertEqual(4, sem.balance)
+
+        for now in range(101, 110):
+            time_mock.return_value = now
+            sem.backoff()
+        # Never drops below the minimum
+        self.assertEqual(1, sem.balance)
+
+    def test_grow(self):
+        sem = limits.AdaptiveSemaphore(4, adaptive=True)
+        sem.limit = 2.0
+        sem.grow()
+        self.assertEqual(2.5, sem.limit)
+        sem.grow()
+        sem.grow()
+        self.assertEqual(3, sem.balance)
+        for _ in range(10):
+            sem.grow()
+        self.assertEqual(4, sem.limit)
+
+    def test_waiters(self):
+        sem = limits.AdaptiveSemaphore(2, adaptive=True)
+        sem.limit = 1.0
+        sem.acquire()
+        acquired = []
+
+        def waiter():
+            sem.acquire()
+            acquired.append(True)
+
+        thread = eventlet.spawn(waiter)
+        eventlet.sleep(0)
+        self.assertEqual([], acquired)
+        # Growing the limit lets the waiter through without a release
+        sem.grow()
+        sem.grow()
+        thread.wait()
+        self.assertEqual([True], acquired)
+        self.assertEqual(2, sem.in_flight)
+
+
+class TestEndpointLimiter(unittest.TestCase):
+    def tearDown(self):
+        limits.configure_limits({})
+
+    def test_not_configured(self):
+        limits.configure_limits({})
+        self.assertIsNone(
+            limits.get_endpoint_limiter('http://s3.example.com', 'bucket'))
+
+    def test_shared_per_endpoint(self):
+        limits.configure_limits({'endpoint_control_conns': 5,
+                                 'endpoint_data_conns': 2})
+        limiter = limits.get_endpoint_limiter('http://s3.example.com', 'b')
+        self.assertIs(
+            limiter,
+            limits.get_endpoint_limiter('http://s3.example.com', 'b'))
+        self.assertIsNot(
+            limiter,
+            limits.get_endpoint_limiter('http://s3.example.com', 'other'))
+        self.assertIsNot(limiter, limits.get_endpoint_limiter(None, 'b'))
+        self.assertEqual(5, limiter.control.balance)
+        self.assertEqual(2, limiter.data.balance)
+
+    def test_adaptive_default_limits(self):
+        limits.configure_limits({'adaptive_concurrency': True})
+        limiter = limits.get_endpoint_limiter(None, 'bucket')
+        self.assertEqual(limits.DEFAULT_ADAPTIVE_CONNS,
+                         limiter.control.balance)
+        self.assertTrue(limiter.data.adaptive)
+
+    def test_missing_limit_defaults_to_other(self):
+        limits.configure_limits({'endpoint_data_conns': '3'})
+        limiter = limits.get_endpoint_limiter(None, 'bucket')
+        self.assertEqual(3, limiter.control.balance)
+        self.assertEqual(3, limiter.data.balance)
+
+    def test_acquire(self):
+        limiter = limits.EndpointLimiter(2, 1)
+        slot = limiter.acquire(data=True)
+        self.assertIs(limiter.data, slot)
+        self.assertEqual(0, limiter.data.balance)
+        self.assertEqual(2, limiter.control.balance)
+        slot.release()
+
+        slot = limiter.acquire()
+        self.assertIs(limiter.control, slot)
+        self.assertEqual(1, limiter.control.balance)
+        self.assertEqual(1, limiter.data.balance)
+        slot.release()
+
+
+class TestRateLimiter(unittest.TestCase):
+    def tearDown(self):
+        limits.configure_limits({})
+
+    @mock.patch('s3_sync.limits.eventlet.sleep')
+    @mock.patch('s3_sync.limits.time.time')
+    def test_token_bucket(self, time_mock, sleep_mock):
+        time_mock.return_value = 100
+        bucket = limits.TokenBucket(10)
+        bucket.consume(10)
+        sleep_mock.assert_not_called()
+        # Going into debt sleeps until it is repaid
+        bucket.consume(5)
+        sleep_mock.assert_called_once_with(0.5)
+        time_mock.return_value = 101
+        sleep_mock.reset_mock()
+        bucket.consume(5)
+        sleep_mock.assert_not_called()
+
+    def test_schedule(self):
+        limiter = limits.RateLimiter({
+            'bandwidth_limit': 100,
+            'rate_schedule': [
+                {'start': '08:00', 'end': '18:00', 'bandwidth_limit': 10},
+                {'start': '22:00', 'end': '02:00', 'request_rate': 5}]})
+
+        def at(hour, minute):
+            return time.mktime((2018, 1, 1, hour, minute, 0, 0, 1, -1))
+
+        self.assertEqual((100, None), limiter.current_limits(at(7, 59)))
+        self.assertEqual((10, None), limiter.current_limits(at(8, 0)))
+        self.assertEqual((100, None), limiter.current_limits(at(18, 0)))
+        self.assertEqual((100, 5), limiter.current_limits(at(23, 0)))
+        self.assertEqual((100, 5), limiter.current_limits(at(1, 59)))
+        self.assertEqual((100, None), limiter.current_limits(at(2, 0)))
+
+    def test_parent(self):
+        parent = mock.Mock()
+        limiter = limits.RateLimiter({'request_rate': 1000}, parent)
+        limiter.consume_bytes(42)
+        limiter.consume_request()
+        parent.consume_bytes.assert_called_once_with(42)
+        parent.consume_request.assert_called_once_with()
+        self.assertIsNone(limiter.bandwidth)
+        self.assertEqual(1000, limiter.requests.rate)
+
+    def test_get_rate_limiter(self):
+        settings = {'account': 'AUTH_test',
+                    'container': 'c1',
+                    'aws_bucket': 'bucket',
+                    'bandwidth_limit': 1024}
+        self.assertIsNone(limits.get_rate_limiter({}))
+        limiter = limits.get_rate_limiter(settings)
+        self.assertIs(limiter, limits.get_rate_limiter(dict(settings)))
+        self.assertIsNone(limiter.parent)
+        # Other mappings to the same bucket have their own limits
+        self.assertIsNot(limiter, limits.get_rate_limiter(
+            dict(settings, container='c2')))
+        # The containers of a per-account mapping share the limits
+        account_limiter = limits.get_rate_limiter(settings, True)
+        self.assertIsNot(limiter, account_limiter)
+        self.assertIs(account_limiter, limits.get_rate_limiter(
+            dict(settings, container='c2'), True))
+
+        limits.configure_limits({'request_rate': 10})
+        global_limiter = limits.get_rate_limiter({})
+        self.assertIsNotNone(global_limiter)
+        limiter = limits.get_rate_limiter(settings)
+        self.assertIs(global_limiter, limiter.parent)
@@ -15,7 +15,7 @@ limitations under the License.
 """
 
 import mock
-import s3_sync
+import s3_sync.__main__
 import sys
 import unittest
 
@@ -24,7 +24,7 @@ class TestMain(unittest.TestCase):
 
     @mock.patch('s3_sync.daemon_utils.os.path.exists')
     @mock.patch('s3_sync.daemon_utils.logging')
-    @mock.patch('s3_sync.__main__.ContainerCrawler')
+    @mock.patch('s3_sync.crawler.SyncCrawler')
     def test_log_lvl(self, crawler_mock, logging_mock, exists_mock):
         exists_mock.return_value = True
         mock_logger = mock.Mock()
@@ -0,0 +1,107 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from s3_sync.object_cache import ObjectCache
+
+
+class TestObjectCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ObjectCache(self.cache_dir, 10, chunk_size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _put(self, path, body, size=None):
+        size = len(''.join(body)) if size is None else size
+        writer = self.cache.writer(path, 'etag', [('Etag', 'etag')], size,
+                                   body)
+        self.assertEqual(body, list(writer))
+
+    def _read(self, path, start=0, stop=None):
+        entry, reader = self.cache.open(path)
+        if start or stop is not None:
+            return ''.join(reader.app_iter_range(start, stop))
+        return ''.join(reader)
+
+    def test_cache_object(self):
+        self._put('/a/c/o', ['abc', 'def'])
+        entry, reader = self.cache.open('/a/c/o')
+        reader.close()
+        self.assertEqual('etag', entry.etag)
+        self.assertEqual([('Etag', 'etag')], entry.headers)
+        self.assertEqual(6, entry.size)
+        self.assertEqual('abcdef', self._read('/a/c/o'))
+        self.assertEqual('bcd', self._read('/a/c/o', 1, 4))
+        self.assertEqual('ef', self._read('/a/c/o', 4))
+        self.assertEqual(6, self.cache.size)
+        self.assertEqual(
+            [str(os.getpid())], os.listdir(self.cache_dir))
+
+    def test_incomplete_object(self):
+        writer = self.cache.writer('/a/c/o', 'etag', [], 6, ['abc', 'def'])
+        self.assertEqual('abc', next(writer))
+        writer.close()
+        self.assertIsNone(self.cache.open('/a/c/o'))
+        # Truncated responses are not cached either
+        self._put('/a/c/o', ['abc'], size=6)
+        self.assertIsNone(self.cache.open('/a/c/o'))
+        self.assertEqual(
+            [], os.listdir(os.path.join(self.cache_dir, str(os.getpid()))))
+
+    def test_evicts_least_recently_used(self):
+        self._put('/a/c/o1', ['abcd'])
+        self._put('/a/c/o2', ['efgh'])
+        self.assertEqual('abcd', self._read('/a/c/o1'))
+        self._put('/a/c/o3', ['ijkl'])
+        self.assertIsNone(self.cache.open('/a/c/o2'))
+        self.assertEqual('abcd', self._read('/a/c/o1'))
+        self.assertEqual('ijkl', self._read('/a/c/o3'))
+        self.assertEqual(8, self.cache.size)
+        self.assertEqual(
+            2, len(os.listdir(os.path.join(self.cache_dir,
+                                           str(os.getpid())))))
+
+        # Objects larger than the cache are not cached at all
+        body = ['too large']
+        self.assertIs(body, self.cache.writer('/a/c/o4', 'etag', [], 11,
+                                              body))
+
+    def test_invalidate(self):
+        self._put('/a/c/o', ['abc'])
+        self.cache.invalidate('/a/c/o')
+        self.cache.invalidate('/a/c/other')
+        self.assertIsNone(self.cache.open('/a/c/o'))
+        self.assertEqual(0, self.cache.size)
+
+    @mock.patch('s3_sync.object_cache.os.kill')
+    def test_removes_stale_dirs(self, mock_kill):
+        os.mkdir(os.path.join(self.cache_dir, '1'))
+        mock_kill.side_effect = OSError(3, 'No such process')
+        self._put('/a/c/o', ['abc'])
+        self.assertEqual([str(os.getpid())], os.listdir(self.cache_dir))
+
+    def test_disabled(self):
+        cache = ObjectCache(None, 10)
+        self.assertFalse(cache.enabled)
+        body = ['abc']
+        self.assertIs(body, cache.writer('/a/c/o', 'etag', [], 3, body))
@@ -14,16 +14,26 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import eventlet
+import hashlib
 import json
-import lxml
+import lxml.etree
 import mock
+import os
+import shutil
 import StringIO
+import subprocess
+import sys
 import tempfile
 import unittest
 
 from swift.common import swob
 
 from s3_sync import shunt
+from s3_sync.archive_index import BloomFilter
+from s3_sync.cache import LRUCache, ListingCache
+from s3_sync.object_cache import ObjectCache
+from s3_sync.single_flight import SingleFlight
 from s3_sync import sync_s3
 from s3_sync import sync_swift
 from s3_sync import utils
@@ -143,6 +153,10 @@ class TestShunt(unittest.TestCase):
         for patcher in self.patchers:
             patcher.__exit__()
 
+    def _get_calls(self):
+        return [env['PATH_INFO'] for env in self.swift.calls
+                if env['REQUEST_METHOD'] == 'GET']
+
     def test_bad_config_noops(self):
         app = shunt.filter_factory(
             {'conf_file': '/etc/doesnt/exist'})(FakeSwift()).shunted_app
@@ -202,6 +216,109 @@ class TestShunt(unittest.TestCase):
             },
         })
 
+    def test_import_does_not_load_providers(self):
+        # The providers' dependencies are imported once a profile uses them
+        modules = ('boto3', 'botocore', 'swiftclient', 's3_sync.sync_s3',
+                   's3_sync.sync_swift')
+        code = ('import sys\n'
+                'import s3_sync.shunt\n'
+                'print([m for m in %r if m in sys.modules])' % (modules,))
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=root)
+        self.assertEqual('[]', output.strip())
+
+    def test_reload_conf_file(self):
+        with tempfile.NamedTemporaryFile() as fp:
+            json.dump(self.conf, fp)
+            fp.flush()
+            app = shunt.filter_factory(
+                {'conf_file': fp.name, 'conf_reload_interval': '0'})(
+                    FakeSwift()).shunted_app
+            self.assertIn(('AUTH_a', 's3'), app.sync_profiles)
+
+            fp.seek(0)
+            fp.truncate()
+            json.dump({'containers': [self.conf['containers'][2]]}, fp)
+            fp.flush()
+            os.utime(fp.name, (1, 1))
+            app._check_conf_file()
+            # The current table is used until the new one is loaded
+            self.assertIn(('AUTH_a', 's3'), app.sync_profiles)
+            eventlet.sleep(0)
+            self.assertEqual([('AUTH_b', '/*')], app.sync_profiles.keys())
+
+            # The table is not reloaded if the file has not changed
+            table = app.profile_table
+            app._check_conf_file()
+            eventlet.sleep(0)
+            self.assertIs(table, app.profile_table)
+
+            # or if it cannot be parsed
+            fp.seek(0)
+            fp.truncate()
+            fp.write('{"containers":')
+            fp.flush()
+            os.utime(fp.name, (2, 2))
+            app._check_conf_file()
+            eventlet.sleep(0)
+            self.assertIs(table, app.profile_table)
+
+    def test_profile_table_lookup(self):
+        table = self.app.shunted_app.profile_table
+        profile, per_account = table.lookup('AUTH_a', 's3')
+        self.assertFalse(per_account)
+        self.assertIs(table.profiles[('AUTH_a', 's3')], profile)
+
+        profile, per_account = table.lookup('AUTH_b', 'c1')
+        self.assertTrue(per_account)
+        self.assertEqual(u'c1', profile['container'])
+        self.assertEqual('dest-bucket', profile['aws_bucket'])
+        # The derived profile is cached
+        self.assertIs(profile, table.lookup('AUTH_b', 'c1')[0])
+        self.assertEqual('/*', table.profiles[('AUTH_b', '/*')]['container'])
+
+        self.assertEqual((None, False), table.lookup('AUTH_a', 'c1'))
+        self.assertEqual((None, False), table.lookup('AUTH_c', 'c1'))
+
+    @mock.patch('s3_sync.shunt.create_provider')
+    def test_profile_table_providers(self, create_mock):
+        providers = [mock.Mock(), mock.Mock()]
+        create_mock.side_effect = providers
+        table = self.app.shunted_app.profile_table
+        profile = table.profiles[('AUTH_a', 's3')]
+
+        providers[0].client_pool.free_count.return_value = 2
+        self.assertIs(providers[0], table.get_provider(profile, 2, False))
+        # The provider is in use until it is released, even if it has not
+        # taken a connection yet
+        self.assertIs(providers[1], table.get_provider(profile, 2, False))
+        table.release_provider(providers[0])
+        # The idle provider is reused
+        self.assertIs(providers[0], table.get_provider(profile, 2, False))
+        self.assertEqual(2, create_mock.call_count)
+
+        # but not while its connections are in use
+        table.release_provider(providers[0])
+        providers[0].client_pool.free_count.return_value = 1
+        providers[1].client_pool.free_count.return_value = 2
+        table.release_provider(providers[1])
+        self.assertIs(providers[1], table.get_provider(profile, 2, False))
+
+    @mock.patch('s3_sync.shunt.create_provider')
+    def test_providers_released(self, create_mock):
+        provider = create_mock.return_value
+        provider.shunt_object.return_value = (200, [], ['remote'])
+        table = self.app.shunted_app.profile_table
+        req = swob.Request.blank('/v1/AUTH_a/s3/obj', environ={
+            '__test__.status': '404 Not Found'})
+        app_iter = self.app(req.environ, lambda *args: None)
+        self.assertIn(provider, table._leased)
+        self.assertEqual('remote', ''.join(app_iter))
+        app_iter.close()
+        self.assertEqual(set(), table._leased)
+
     def test_unshunted_requests(self):
         def _do_test(path, method='GET'):
             req = swob.Request.blank(path, method=method, environ={
@@ -365,6 +482,8 @@ class TestShunt(unittest.TestCase):
             req = swob.Request.blank(u'/v1/%s/foo' % path, environ=env)
             status, headers, body_iter = req.call_application(self.app)
             resp_body = b''.join(body_iter)
+            # The object is restored in the background
+            self.app.shunted_app.restore_pool.waitall()
             path = path.encode('utf-8')
             account = path.split('/', 1)[0]
             if not is_put_back:
@@ -398,9 +517,339 @@ class TestShunt(unittest.TestCase):
                         ('PUT', '/v1/%s/foo' % path),
                     ])
             self.assertEqual(payload, resp_body)
+            # The manifest is only fetched for SLOs
+            if mock_call is mock_s3_shunt:
+                mock_get_manifest = mock_s3_get_manifest
+            else:
+                mock_get_manifest = mock_swift_get_manifest
+            self.assertEqual(1 if is_slo else 0,
+                             mock_get_manifest.call_count)
+            mock_get_manifest.reset_mock()
             mock_call.reset_mock()
             self.swift.calls = []
 
+    @mock.patch.object(sync_s3.SyncS3, 'get_manifest')
+    @mock.patch.object(sync_s3.SyncS3, 'shunt_object')
+    def test_restore_in_progress(self, mock_shunt, mock_get_manifest):
+        payload = 'bytes from remote'
+        mock_shunt.return_value = (
+            200, [('Content-Length', len(payload))],
+            StringIO.StringIO(payload))
+        self.app.shunted_app.restoring.add('/v1/AUTH_tee/tee/foo')
+        env = {'__test__.response_dict': {
+            'GET': {'status': '404 Not Found'}}}
+        req = swob.Request.blank('/v1/AUTH_tee/tee/foo', environ=env)
+        status, headers, body_iter = req.call_application(self.app)
+        self.assertEqual(payload, b''.join(body_iter))
+        self.app.shunted_app.restore_pool.waitall()
+        self.assertEqual(
+            [(e['REQUEST_METHOD'], e['PATH_INFO']) for e in self.swift.calls],
+            [('HEAD', '/v1/AUTH_tee'), ('GET', '/v1/AUTH_tee/tee/foo')])
+        mock_get_manifest.assert_not_called()
+
+    @mock.patch.object(sync_s3.SyncS3, 'shunt_object')
+    def test_conditional_get_not_coalesced(self, mock_shunt):
+        mock_shunt.return_value = (
+            304, [('Content-Length', 0), ('etag', 'deadbeef')], [''])
+        shunted_app = self.app.shunted_app
+        shunted_app.single_flight = mock.Mock(wraps=SingleFlight(1024))
+        env = {'__test__.status': '404 Not Found'}
+        req = swob.Request.blank('/v1/AUTH_a/s3/o', environ=env,
+                                 headers={'If-None-Match': 'deadbeef'})
+        status, headers, body_iter = req.call_application(self.app)
+        self.assertEqual('304 Not Modified', status)
+        shunted_app.single_flight.fetch.assert_not_called()
+
+        req = swob.Request.blank('/v1/AUTH_a/s3/o', environ=env,
+                                 headers={'Range': 'bytes=0-1'})
+        req.call_application(self.app)
+        shunted_app.single_flight.fetch.assert_called_once_with(
+            ('/v1/AUTH_a/s3/o', 'bytes=0-1'), mock.ANY)
+
+    @mock.patch.object(sync_s3.SyncS3, 'shunt_object')
+    def test_restore_large_object(self, mock_shunt):
+        shunted_app = self.app.shunted_app
+        shunted_app.restore_max_spool_size = 4
+        payload = 'bytes from remote'
+        mock_shunt.return_value = (
+            200, [('Content-Length', len(payload)), ('etag', 'deadbeef')],
+            StringIO.StringIO(payload))
+        puts = []
+
+        def local_app(env, start_response):
+            req = swob.Request(env)
+            if req.method == 'PUT':
+                puts.append((req.path, req.body))
+                return swob.HTTPCreated()(env, start_response)
+            return swob.HTTPNotFound()(env, start_response)
+        shunted_app.app = local_app
+
+        req = swob.Request.blank('/v1/AUTH_tee/tee/foo')
+        with mock.patch('s3_sync.utils.tempfile.TemporaryFile') as \
+                mock_tempfile:
+            status, headers, body_iter = req.call_application(self.app)
+            self.assertEqual(payload, b''.join(body_iter))
+        shunted_app.restore_pool.waitall()
+        # The object is streamed into Swift instead of being spooled (and
+        # is only fetched once)
+        mock_tempfile.assert_not_called()
+        self.assertEqual(1, mock_shunt.call_count)
+        self.assertEqual([('/v1/AUTH_tee/tee/foo', payload)], puts)
+        self.assertEqual(set(), shunted_app.restoring)
+
+    @mock.patch.object(sync_s3.SyncS3, 'shunt_object')
+    def test_metadata_cache(self, mock_shunt):
+        self.app.shunted_app.metadata_cache = LRUCache(10, 60)
+        env = {'__test__.status': '404 Not Found'}
+        mock_shunt.return_value = (
+            200, [('Content-Length', 3), ('etag', 'deadbeef')], ['abc'])
+
+        def do_request(method, headers={}):
+            req = swob.Request.blank('/v1/AUTH_a/s3/o', environ=dict(
+                env, REQUEST_METHOD=method), headers=headers)
+            status, headers, body_iter = req.call_application(self.app)
+            return status, dict(headers), b''.join(body_iter)
+
+        self.assertEqual(
+            ('200 OK', {'Content-Length': 3, 'etag': 'deadbeef'}, 'abc'),
+            do_request('GET'))
+        # HEADs are served from the cache
+        self.assertEqual(
+            ('200 OK', {'Content-Length': 3, 'etag': 'deadbeef'}, ''),
+            do_request('HEAD'))
+        self.assertEqual(1, mock_shunt.call_count)
+        # ... unless they are conditional
+        do_request('HEAD', {'If-Match': 'deadbeef'})
+        self.assertEqual(2, mock_shunt.call_count)
+        # GETs always go to the remote store
+        do_request('GET')
+        self.assertEqual(3, mock_shunt.call_count)
+
+        # Writes invalidate the cached entry
+        do_request('DELETE')
+        mock_shunt.reset_mock()
+        mock_shunt.return_value = (404, [('Content-Length', 9)],
+                                   iter('Not found'))
+        self.assertEqual(('404 Not Found', {'Content-Length': 9},
+                          'Not found'), do_request('HEAD'))
+        self.assertEqual(('404 Not Found', {'Content-Length': 9},
+                          'Not found'), do_request('GET'))
+        self.assertEqual(1, mock_shunt.call_count)
+
+    @mock.patch('s3_sync.shunt.get_container_info')
+    def test_archive_index(self, mock_container_info):
+        self.app.shunted_app.sync_profiles[('AUTH_a', 's3')][
+            'archive_index'] = True
+        index = BloomFilter()
+        index.add('archived')
+        index.add('local')
+        mock_container_info.return_value = {'sysmeta': {
+            'shunt-archive-index-db-id': index.serialize()}}
+
+        def do_request(path, status='200 OK'):
+            req = swob.Request.blank(path, environ={
+                '__test__.status': status,
+                '__test__.body': ['local']})
+            status, headers, body_iter = req.call_application(self.app)
+            return status, b''.join(body_iter)
+
+        # The remote GET of archived objects is issued along with the local
+        # one
+        self.assertEqual(('200 OK', b'remote s3'),
+                         do_request('/v1/AUTH_a/s3/archived', '404 Not Found'))
+        self.assertEqual(1, len(self._get_calls()))
+        self.assertEqual(1, self.mock_shunt_s3.call_count)
+
+        # Objects that were overwritten after they were archived are
+        # retrieved from Swift
+        self.assertEqual(('200 OK', b'local'),
+                         do_request('/v1/AUTH_a/s3/local'))
+        self.assertEqual(2, len(self._get_calls()))
+
+        # Other objects are only retrieved from the remote store after a 404
+        self.mock_shunt_s3.reset_mock()
+        self.assertEqual(('200 OK', b'local'),
+                         do_request('/v1/AUTH_a/s3/other'))
+        self.assertEqual(3, len(self._get_calls()))
+        self.assertEqual(0, self.mock_shunt_s3.call_count)
+
+    def test_speculative_get(self):
+        self.app.shunted_app.sync_profiles[('AUTH_a', 's3')][
+            'speculative_get'] = True
+
+        def do_request(status):
+            req = swob.Request.blank('/v1/AUTH_a/s3/o', environ={
+                '__test__.status': status,
+                '__test__.body': ['local']})
+            status, headers, body_iter = req.call_application(self.app)
+            return status, b''.join(body_iter)
+
+        self.assertEqual(('200 OK', b'remote s3'),
+                         do_request('404 Not Found'))
+        self.assertEqual(1, len(self._get_calls()))
+        self.assertEqual(1, self.mock_shunt_s3.call_count)
+        self.assertEqual('/v1/AUTH_a/s3/o',
+                         self.mock_shunt_s3.mock_calls[0][1][0].path)
+
+        # The remote request is abandoned if the object is in Swift
+        self.mock_shunt_s3.reset_mock()
+        self.assertEqual(('200 OK', b'local'), do_request('200 OK'))
+        eventlet.sleep(0)
+        self.assertEqual(0, self.mock_shunt_s3.call_count)
+
+    def test_speculative_get_closes_remote_response(self):
+        self.app.shunted_app.sync_profiles[('AUTH_a', 's3')][
+            'speculative_get'] = True
+        remote_body = mock.Mock()
+        self.mock_shunt_s3.return_value = (200, [], remote_body)
+
+        def slow_local(env, start_response):
+            # Let the remote request complete first
+            eventlet.sleep(0.01)
+            start_response('200 OK', [])
+            return ['local']
+        self.app.shunted_app.app = slow_local
+
+        req = swob.Request.blank('/v1/AUTH_a/s3/o')
+        status, headers, body_iter = req.call_application(self.app)
+        self.assertEqual(b'local', b''.join(body_iter))
+        self.assertEqual(1, self.mock_shunt_s3.call_count)
+        remote_body.close.assert_called_once_with()
+
+    def test_object_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.app.shunted_app.object_cache = ObjectCache(cache_dir, 1024)
+        self.app.shunted_app.sync_profiles[('AUTH_a', 's3')][
+            'cache_objects'] = True
+        self.mock_shunt_s3.return_value = (
+            200, [('Content-Length', '9'), ('Etag', 'deadbeef')],
+            ['remote s3'])
+
+        def do_request(headers={}):
+            req = swob.Request.blank('/v1/AUTH_a/s3/o', environ={
+                '__test__.status': '404 Not Found'}, headers=headers)
+            status, headers, body_iter = req.call_application(self.app)
+            return status, b''.join(body_iter)
+
+        self.assertEqual(('200 OK', b'remote s3'), do_request())
+        self.assertEqual(['GET'], [
+            call[1][0].method for call in self.mock_shunt_s3.mock_calls])
+
+        # The cached object is validated with a HEAD request
+        self.mock_shunt_s3.reset_mock()
+        self.mock_shunt_s3.return_value = (
+            200, [('Content-Length', '9'), ('Etag', 'deadbeef')], [''])
+        self.assertEqual(('200 OK', b'remote s3'), do_request())
+        self.assertEqual(('206 Partial Content', b'mote'),
+                         do_request({'Range': 'bytes=2-5'}))
+        self.assertEqual(['HEAD', 'HEAD'], [
+            call[1][0].method for call in self.mock_shunt_s3.mock_calls])
+        head_req = self.mock_shunt_s3.mock_calls[1][1][0]
+        self.assertNotIn('Range', head_req.headers)
+
+        # Changed objects are retrieved again
+        self.mock_shunt_s3.reset_mock()
+        self.mock_shunt_s3.return_value = (
+            200, [('Content-Length', '7'), ('Etag', 'cafebabe')],
+            ['changed'])
+        self.assertEqual(('200 OK', b'changed'), do_request())
+        self.assertEqual(['HEAD', 'GET'], [
+            call[1][0].method for call in self.mock_shunt_s3.mock_calls])
+        entry, reader = self.app.shunted_app.object_cache.open(
+            '/v1/AUTH_a/s3/o')
+        reader.close()
+        self.assertEqual('cafebabe', entry.etag)
+
+    def _setup_slo_range(self, mock_get_manifest):
+        remote_data = 'aaaaabbbbb'
+        segments = ['aaaaa', 'bbbbb']
+        mock_get_manifest.return_value = [
+            {'name': '/segments/%d' % i, 'bytes': len(data),
+             'hash': hashlib.md5(data).hexdigest()}
+            for i, data in enumerate(segments)]
+
+        def remote_object(req, obj):
+            headers = [('Content-Length', str(len(remote_data))),
+                       ('etag', 'slo-etag'),
+                       ('x-static-large-object', 'True')]
+            if req.method == 'HEAD':
+                return 200, headers, ['']
+            start, end = req.range.ranges_for_length(len(remote_data))[0]
+            return 206, headers, iter([remote_data[start:end]])
+        self.mock_shunt_s3.side_effect = remote_object
+
+        puts = {}
+
+        def local_app(env, start_response):
+            req = swob.Request(env)
+            if req.method == 'PUT':
+                puts[req.path] = req.body
+                return swob.HTTPCreated()(env, start_response)
+            if req.path == '/v1/AUTH_a/segments/0':
+                return swob.Response(
+                    body=segments[0],
+                    etag=hashlib.md5(segments[0]).hexdigest(),
+                    request=req, conditional_response=True)(
+                        env, start_response)
+            return swob.HTTPNotFound()(env, start_response)
+        self.app.shunted_app.app = local_app
+        return puts
+
+    def _get_range(self, range_header):
+        req = swob.Request.blank('/v1/AUTH_a/s3/slo',
+                                 headers={'Range': range_header})
+        status, headers, body_iter = req.call_application(self.app)
+        return status, dict(headers), b''.join(body_iter)
+
+    @mock.patch.object(sync_s3.SyncS3, 'get_manifest')
+    def test_slo_range(self, mock_get_manifest):
+        self.app.shunted_app.sync_profiles[('AUTH_a', 's3')][
+            'segment_ranges'] = True
+        self._setup_slo_range(mock_get_manifest)
+
+        status, headers, body = self._get_range('bytes=3-7')
+        self.assertEqual('206 Partial Content', status)
+        self.assertEqual('bytes 3-7/10', headers['Content-Range'])
+        self.assertEqual('5', headers['Content-Length'])
+        self.assertEqual('aabbb', body)
+        # The first segment is read from Swift
+        remote_reqs = [call[1][0] for call in self.mock_shunt_s3.mock_calls]
+        self.assertEqual(['HEAD', 'GET'], [r.method for r in remote_reqs])
+        self.assertEqual('bytes=5-7', remote_reqs[1].headers['Range'])
+        self.assertEqual('slo-etag', remote_reqs[1].headers['If-Match'])
+
+    @mock.patch.object(sync_s3.SyncS3, 'get_manifest')
+    def test_slo_range_metadata_cache(self, mock_get_manifest):
+        self.app.shunted_app.sync_profiles[('AUTH_a', 's3')][
+            'segment_ranges'] = True
+        self.app.shunted_app.metadata_cache = LRUCache(10, 60)
+        self._setup_slo_range(mock_get_manifest)
+
+        self.assertEqual('aabbb', self._get_range('bytes=3-7')[2])
+        self.assertEqual('bbb', self._get_range('bytes=7-9')[2])
+        # The remote object is only checked once
+        remote_reqs = [call[1][0] for call in self.mock_shunt_s3.mock_calls]
+        self.assertEqual(['HEAD', 'GET', 'GET'],
+                         [r.method for r in remote_reqs])
+
+    @mock.patch.object(sync_s3.SyncS3, 'get_manifest')
+    def test_slo_range_restore_segments(self, mock_get_manifest):
+        self.app.shunted_app.sync_profiles[('AUTH_a', 's3')][
+            'restore_segments'] = True
+        puts = self._setup_slo_range(mock_get_manifest)
+
+        status, headers, body = self._get_range('bytes=6-7')
+        self.assertEqual('206 Partial Content', status)
+        self.assertEqual('bytes 6-7/10', headers['Content-Range'])
+        self.assertEqual('bb', body)
+        remote_reqs = [call[1][0] for call in self.mock_shunt_s3.mock_calls]
+        self.assertEqual('bytes=5-9', remote_reqs[1].headers['Range'])
+        # Only the touched segment is restored
+        self.app.shunted_app.restore_pool.waitall()
+        self.assertEqual({'/v1/AUTH_a/segments/1': 'bbbbb'}, puts)
+        self.assertEqual(set(), self.app.shunted_app.restoring)
+
     def test_list_container_no_shunt(self):
         req = swob.Request.blank(
             '/v1/AUTH_a/foo',
@@ -430,11 +879,12 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call('', 10000, '', ''),
             mock.call('unicod\xc3\xa9', 10000, '', '')])
-        names = body_iter.split('\n')
+        names = body.decode('utf-8').split('\n')
         self.assertEqual(['abc', u'unicod\xe9'], names)
 
     def test_list_container_shunt_s3_xml(self):
@@ -456,11 +906,12 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call('', 10000, '', ''),
             mock.call(u'unicod\xc3\xa9'.encode('utf-8'), 10000, '', '')])
-        root = lxml.etree.fromstring(body_iter)
+        root = lxml.etree.fromstring(body)
         context = lxml.etree.iterwalk(root, events=("start", "end"))
         element_index = 0
         cur_elem_properties = {}
@@ -499,11 +950,12 @@ class TestShunt(unittest.TestCase):
                      'swift.trans_id': 'id'},
             headers={'Accept': 'application/xml'})
         status, headers, body_iter = req.call_application(self.app)
+        body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call('', 10000, '', ''),
             mock.call(u'unicod\xc3\xa9'.encode('utf-8'), 10000, '', '')])
-        root = lxml.etree.fromstring(body_iter)
+        root = lxml.etree.fromstring(body)
         context = lxml.etree.iterwalk(root, events=("start", "end"))
         element_index = 0
         cur_elem_properties = {}
@@ -522,6 +974,31 @@ class TestShunt(unittest.TestCase):
                     except ValueError:
                         cur_elem_properties[elem.tag] = elem.text
 
+    def test_list_container_xml_escaping(self):
+        self.mock_list_s3.side_effect = [
+            (200, [{'name': u'a&b<c>\xe9', 'hash': 'ffff', 'bytes': 42}]),
+            (200, [])]
+        req = swob.Request.blank(
+            '/v1/AUTH_a/s3?format=xml',
+            environ={'__test__.status': '200 OK',
+                     '__test__.body': '[{"subdir": "\\"d\\"/"}]',
+                     'swift.trans_id': 'id'})
+        status, headers, body_iter = req.call_application(self.app)
+        self.assertEqual(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<container name="s3">'
+            '<object><subdir>"d"/</subdir></object>'
+            '<object><name>a&amp;b&lt;c&gt;\xc3\xa9</name>'
+            '<hash>ffff</hash><bytes>42</bytes></object>'
+            '</container>', b''.join(body_iter))
+
+    def test_format_xml_listing_empty(self):
+        self.assertEqual(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<container name="a&amp;&quot;b&quot;&#10;"/>',
+            ''.join(shunt.S3SyncShunt._format_listing_response(
+                [], 'application/xml', 'a&"b"\n')))
+
     def test_list_container_shunt_s3_json(self):
         elements = [{'name': 'abc',
                      'hash': 'ffff',
@@ -541,11 +1018,12 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call('', 10000, '', ''),
             mock.call(u'unicod\xc3\xa9'.encode('utf-8'), 10000, '', '')])
-        results = json.loads(body_iter)
+        results = json.loads(body)
         for i, entry in enumerate(results):
             self.assertEqual(elements[i], entry)
 
@@ -569,14 +1047,88 @@ class TestShunt(unittest.TestCase):
                      'swift.trans_id': 'id'},
             headers={'Accept': 'application/json'})
         status, headers, body_iter = req.call_application(self.app)
+        body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_s3.assert_has_calls([
             mock.call('', 10000, '', ''),
             mock.call(u'unicod\xc3\xa9'.encode('utf-8'), 10000, '', '')])
-        results = json.loads(body_iter)
+        results = json.loads(body)
         for i, entry in enumerate(results):
             self.assertEqual(elements[i], entry)
 
+    def test_list_container_splice(self):
+        self.mock_list_s3.side_effect = [
+            (200, [{'subdir': u'a/'},
+                   {'name': u'b', 'hash': 'remote'},
+                   {'name': u'd', 'hash': 'remote'}]),
+            (200, [{'name': u'e', 'hash': 'remote'},
+                   {'name': u'f', 'hash': 'remote'}]),
+            (200, [])]
+        local = [{'name': u'b', 'hash': 'local'},
+                 {'name': u'c', 'hash': 'local'},
+                 {'subdir': u'c/'}]
+        local_body = json.dumps(local)
+        req = swob.Request.blank(
+            '/v1/AUTH_a/s3?format=json&limit=6',
+            environ={'__test__.status': '200 OK',
+                     '__test__.headers': [
+                         ('Content-Length', str(len(local_body)))],
+                     # Split the local listing mid-entry
+                     '__test__.body': [local_body[:10], local_body[10:]],
+                     'swift.trans_id': 'id'})
+        status, headers, body_iter = req.call_application(self.app)
+        body = b''.join(body_iter)
+        self.assertNotIn('Content-Length', dict(headers))
+        self.assertEqual(
+            [{'subdir': u'a/'},
+             {'name': u'b', 'hash': 'local'},
+             {'name': u'c', 'hash': 'local'},
+             {'subdir': u'c/'},
+             {'name': u'd', 'hash': 'remote'},
+             {'name': u'e', 'hash': 'remote'}],
+            json.loads(body))
+        # The short pages are not prefetched, so the listing stops at the
+        # page that completed it
+        self.assertEqual([
+            mock.call('', 6, '', ''),
+            mock.call('d', 6, '', '')], self.mock_list_s3.mock_calls)
+
+    def test_list_container_cache(self):
+        self.app.shunted_app.listing_cache = ListingCache(10, 60)
+        self.mock_list_s3.side_effect = lambda marker, *args: (
+            200, [] if marker else [{'name': u'remote'}])
+
+        def do_request(method, path='/v1/AUTH_a/s3'):
+            req = swob.Request.blank(
+                path,
+                environ={'REQUEST_METHOD': method,
+                         '__test__.status': '200 OK',
+                         '__test__.body': '[]',
+                         'swift.trans_id': 'id'})
+            status, headers, body_iter = req.call_application(self.app)
+            return b''.join(body_iter)
+
+        self.assertEqual(b'remote', do_request('GET'))
+        self.assertEqual(2, self.mock_list_s3.call_count)
+        self.assertEqual(b'remote', do_request('GET'))
+        self.assertEqual(2, self.mock_list_s3.call_count)
+
+        do_request('PUT', '/v1/AUTH_a/s3/object')
+        self.assertEqual(b'remote', do_request('GET'))
+        self.assertEqual(4, self.mock_list_s3.call_count)
+
+    def test_list_container_local_error(self):
+        req = swob.Request.blank(
+            '/v1/AUTH_a/s3',
+            environ={'__test__.status': '503 Service Unavailable',
+                     '__test__.body': ['error'],
+                     'swift.trans_id': 'id'})
+        status, headers, body_iter = req.call_application(self.app)
+        self.assertEqual('503 Service Unavailable', status)
+        self.assertEqual(b'error', b''.join(body_iter))
+        # The remote listing is abandoned
+        self.assertEqual([], self.mock_list_s3.mock_calls)
+
     @mock.patch('s3_sync.shunt.create_provider')
     def test_list_container_shunt_all_containers(self, create_mock):
         create_mock.return_value = mock.Mock()
@@ -631,9 +1183,10 @@ class TestShunt(unittest.TestCase):
                      '__test__.body': '[]',
                      'swift.trans_id': 'id'})
         status, headers, body_iter = req.call_application(self.app)
+        body = b''.join(body_iter)
         self.assertEqual(self.mock_shunt_swift.mock_calls, [])
         self.mock_list_swift.assert_has_calls([
             mock.call('', 10000, '', ''),
             mock.call(u'unicod\xe9'.encode('utf-8'), 10000, '', '')])
-        names = body_iter.split('\n')
+        names = body.decode('utf-8').split('\n')
         self.assertEqual(['abc', u'unicod\xe9'], names)
@@ -0,0 +1,113 @@
+"""
+Copyright 2017 SwiftStack
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import eventlet
+import mock
+from s3_sync.single_flight import FlightError, SingleFlight
+import unittest
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.single_flight = SingleFlight(1024)
+        self.release = eventlet.event.Event()
+        self.calls = 0
+
+    def _fetch(self, status=200, length=6, body=('abc', 'def')):
+        def _body():
+            for chunk in body:
+                self.release.wait()
+                yield chunk
+
+        def fetch():
+            self.calls += 1
+            eventlet.sleep(0)
+            return status, [('Content-Length', length)], _body()
+        return fetch
+
+    def _get(self, key, fetch):
+        status, headers, body = self.single_flight.fetch(key, fetch)
+        return status, headers, ''.join(body)
+
+    def test_coalesce(self):
+        fetch = self._fetch()
+        threads = [eventlet.spawn(self._get, 'key', fetch) for _ in range(5)]
+        eventlet.sleep(0)
+        self.release.send()
+        for thread in threads:
+            self.assertEqual((200, [('Content-Length', 6)], 'abcdef'),
+                             thread.wait())
+        self.assertEqual(1, self.calls)
+        self.assertEqual({}, self.single_flight.flights)
+
+        # Once the flight completes, the next request fetches the object again
+        self.assertEqual('abcdef', self._get('key', fetch)[2])
+        self.assertEqual(2, self.calls)
+
+    def test_different_keys(self):
+        fetch = self._fetch()
+        threads = [eventlet.spawn(self._get, key, fetch)
+                   for key in ('key', 'other-key')]
+        eventlet.sleep(0)
+        self.release.send()
+        for thread in threads:
+            self.assertEqual('abcdef', thread.wait()[2])
+        self.assertEqual(2, self.calls)
+
+    def test_not_shared(self):
+        for status, length in ((404, 6), (200, 2048)):
+            self.calls = 0
+            fetch = self._fetch(status, length)
+            threads = [eventlet.spawn(self._get, 'key', fetch)
+                       for _ in range(3)]
+            eventlet.sleep(0)
+            self.release.send()
+            for thread in threads:
+                self.assertEqual('abcdef', thread.wait()[2])
+            self.assertEqual(3, self.calls)
+            self.release.reset()
+
+    def test_max_total(self):
+        self.single_flight.max_total = 10
+        fetch = self._fetch()
+        threads = [eventlet.spawn(self._get, key, fetch)
+                   for key in ('key', 'key', 'other-key', 'other-key')]
+        eventlet.sleep(0)
+        eventlet.sleep(0)
+        self.assertEqual(6, SingleFlight.buffered)
+        self.release.send()
+        for thread in threads:
+            self.assertEqual('abcdef', thread.wait()[2])
+        # The second object does not fit within the limit
+        self.assertEqual(3, self.calls)
+        self.assertEqual(0, SingleFlight.buffered)
+
+    def test_disabled(self):
+        single_flight = SingleFlight(0)
+        fetch = mock.Mock(return_value=(200, [], iter([])))
+        self.assertIs(fetch.return_value,
+                      single_flight.fetch('key', fetch))
+
+    def test_remote_read_error(self):
+        def _body():
+            yield 'abc'
+            raise IOError('timeout')
+
+        fetch = mock.Mock(return_value=(200, [('Content-Length', 6)], _body()))
+        status, headers, body = self.single_flight.fetch('key', fetch)
+        self.assertEqual('abc', next(body))
+        with self.assertRaises(FlightError):
+            next(body)
@@ -20,6 +20,7 @@ import time
 import unittest
 
 from container_crawler import RetryError
+from s3_sync.archive_index import BloomFilter
 from s3_sync.sync_container import SyncContainer
 from s3_sync.sync_s3 import SyncS3
 from s3_sync.sync_swift import SyncSwift
@@ -391,6 +392,51 @@ class TestSyncContainer(unittest.TestCase):
             settings['account'], settings['container'], row['name'],
             headers={'X-Timestamp': Timestamp(swift_ts).internal})
 
+    @mock.patch('s3_sync.sync_s3.boto3.session.Session')
+    def test_archive_index(self, session_mock):
+        settings = {
+            'aws_bucket': self.aws_bucket,
+            'aws_identity': 'identity',
+            'aws_secret': 'credential',
+            'account': 'account',
+            'container': 'container',
+            'retain_local': False,
+            'archive_index': True}
+
+        sync = SyncContainer(self.scratch_space, settings)
+        sync.provider = mock.Mock()
+        swift_client = mock.Mock()
+        existing = BloomFilter()
+        existing.add('bar')
+        swift_client.get_container_metadata.return_value = {
+            'db-id': existing.serialize()}
+        for name in ('foo', u'unicod\xe9'):
+            sync.handle({'deleted': 0,
+                         'created_at': str(time.time() - 5),
+                         'name': name,
+                         'storage_policy_index': 99}, swift_client)
+
+        with mock.patch('s3_sync.sync_container.open', create=True), \
+                mock.patch('s3_sync.sync_container.os.path.exists') as \
+                mock_exists, \
+                mock.patch('s3_sync.sync_container.json'):
+            mock_exists.return_value = True
+            sync.save_last_row(42, 'db-id')
+
+        swift_client.get_container_metadata.assert_called_once_with(
+            'account', 'container',
+            metadata_prefix='X-Container-Sysmeta-Shunt-Archive-Index-')
+        self.assertEqual(1, swift_client.set_container_metadata.call_count)
+        account, container, metadata = \
+            swift_client.set_container_metadata.mock_calls[0][1]
+        self.assertEqual(['X-Container-Sysmeta-Shunt-Archive-Index-db-id'],
+                         metadata.keys())
+        index = BloomFilter.deserialize(metadata.values()[0])
+        self.assertEqual(3, index.count)
+        for name in ('foo', u'unicod\xe9', 'bar'):
+            self.assertIn(name, index)
+        self.assertNotIn('baz', index)
+
     @mock.patch('s3_sync.sync_s3.boto3.session.Session')
     def test_no_propagate_delete(self, session_mock):
         settings = {
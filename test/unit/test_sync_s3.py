@@ -76,7 +76,10 @@ class TestSyncS3(unittest.TestCase):
         mock_file_wrapper.assert_called_with(mock_ic,
                                              self.sync_s3.account,
                                              self.sync_s3.container,
-                                             key, swift_req_headers)
+                                             key, swift_req_headers,
+                                             rate_limiter=None,
+                                             spool_size=0,
+                                             chunk_size=65536)
 
         self.mock_boto3_client.put_object.assert_called_with(
             Bucket=self.aws_bucket,
@@ -114,7 +117,10 @@ class TestSyncS3(unittest.TestCase):
         mock_file_wrapper.assert_called_with(mock_ic,
                                              self.sync_s3.account,
                                              self.sync_s3.container,
-                                             key, swift_req_headers)
+                                             key, swift_req_headers,
+                                             rate_limiter=None,
+                                             spool_size=0,
+                                             chunk_size=65536)
 
         self.mock_boto3_client.put_object.assert_called_with(
             Bucket=self.aws_bucket,
@@ -151,7 +157,10 @@ class TestSyncS3(unittest.TestCase):
         mock_file_wrapper.assert_called_with(mock_ic,
                                              self.sync_s3.account,
                                              self.sync_s3.container,
-                                             key, swift_req_headers)
+                                             key, swift_req_headers,
+                                             rate_limiter=None,
+                                             spool_size=0,
+                                             chunk_size=65536)
 
         self.mock_boto3_client.put_object.assert_called_with(
             Bucket=self.aws_bucket,
@@ -196,7 +205,10 @@ class TestSyncS3(unittest.TestCase):
         mock_file_wrapper.assert_called_with(mock_ic,
                                              self.sync_s3.account,
                                              self.sync_s3.container,
-                                             key, swift_req_headers)
+                                             key, swift_req_headers,
+                                             rate_limiter=None,
+                                             spool_size=0,
+                                             chunk_size=65536)
 
         self.mock_boto3_client.put_object.assert_called_with(
             Bucket=self.aws_bucket,
@@ -318,7 +330,10 @@ class TestSyncS3(unittest.TestCase):
         mock_file_wrapper.assert_called_with(mock_ic,
                                              self.sync_s3.account,
                                              self.sync_s3.container,
-                                             key, swift_req_headers)
+                                             key, swift_req_headers,
+                                             rate_limiter=None,
+                                             spool_size=0,
+                                             chunk_size=65536)
 
         self.mock_boto3_client.put_object.assert_called_with(
             Bucket=self.aws_bucket,
@@ -1367,3 +1382,22 @@ class TestSyncS3(unittest.TestCase):
             Prefix=prefix,
             MaxKeys=10)
         self.assertEqual(500, status)
+
+    def test_is_throttle_error(self):
+        def client_error(code, status):
+            return ClientError(
+                dict(Error=dict(Code=code, Message='message'),
+                     ResponseMetadata=dict(HTTPStatusCode=status,
+                                           HTTPHeaders={})),
+                'PUT')
+
+        self.assertTrue(self.sync_s3._is_throttle_error(
+            client_error('SlowDown', 503)))
+        self.assertTrue(self.sync_s3._is_throttle_error(
+            client_error('ServiceUnavailable', 503)))
+        self.assertTrue(self.sync_s3._is_throttle_error(
+            client_error('RequestLimitExceeded', 400)))
+        self.assertFalse(self.sync_s3._is_throttle_error(
+            client_error('NoSuchKey', 404)))
+        self.assertFalse(self.sync_s3._is_throttle_error(
+            RuntimeError('SlowDown')))
@@ -93,13 +93,17 @@ class TestSyncSwift(unittest.TestCase):
         mock_file_wrapper.assert_called_with(mock_ic,
                                              self.sync_swift.account,
                                              self.sync_swift.container,
-                                             key, swift_req_headers)
+                                             key, swift_req_headers,
+                                             rate_limiter=None,
+                                             spool_size=0,
+                                             chunk_size=65536)
 
         swift_client.put_object.assert_called_with(
             self.aws_bucket, key, wrapper,
             headers={'Content-Type': 'application/testing'},
             etag='deadbeef',
-            content_length=0)
+            content_length=0,
+            chunk_size=65536)
 
     @mock.patch('s3_sync.sync_swift.swiftclient.client.Connection')
     @mock.patch('s3_sync.sync_swift.check_slo')
@@ -129,11 +133,14 @@ class TestSyncSwift(unittest.TestCase):
         mock_file_wrapper.assert_called_with(mock_ic,
                                              self.sync_swift.account,
                                              self.sync_swift.container,
-                                             key, swift_req_headers)
+                                             key, swift_req_headers,
+                                             rate_limiter=None,
+                                             spool_size=0,
+                                             chunk_size=65536)
 
         swift_client.put_object.assert_called_with(
             self.aws_bucket, key, wrapper, headers={},
-            etag='deadbeef', content_length=0)
+            etag='deadbeef', content_length=0, chunk_size=65536)
 
     @mock.patch('s3_sync.sync_swift.swiftclient.client.Connection')
     def test_upload_changed_meta(self, mock_swift):
@@ -214,7 +221,8 @@ class TestSyncSwift(unittest.TestCase):
             headers={'x-object-meta-new': 'new',
                      'x-object-meta-old': 'updated'},
             etag='2',
-            content_length=42)
+            content_length=42,
+            chunk_size=65536)
 
     @mock.patch('s3_sync.sync_swift.swiftclient.client.Connection')
     def test_upload_same_object(self, mock_swift):
@@ -285,10 +293,10 @@ class TestSyncSwift(unittest.TestCase):
         swift_client.put_object.assert_has_calls([
             mock.call(segment_container,
                       'slo-object/part1', mock.ANY, etag='deadbeef',
-                      content_length=1024),
+                      content_length=1024, chunk_size=65536),
             mock.call(self.aws_bucket + '_segments',
                       'slo-object/part2', mock.ANY, etag='beefdead',
-                      content_length=1024),
+                      content_length=1024, chunk_size=65536),
             mock.call(self.aws_bucket, slo_key,
                       mock.ANY,
                       headers={'Content-Type': 'application/slo'},
@@ -648,3 +656,12 @@ class TestSyncSwift(unittest.TestCase):
         self.sync_swift.upload_object('foo', 'policy', mock_ic)
         self.assertEqual([mock.call.head_object('bucketcontainer', 'foo')],
                          swift_client.mock_calls)
+
+    def test_is_throttle_error(self):
+        for status in (429, 498, 503):
+            self.assertTrue(self.sync_swift._is_throttle_error(
+                ClientException('slow down', http_status=status)))
+        self.assertFalse(self.sync_swift._is_throttle_error(
+            ClientException('not found', http_status=404)))
+        self.assertFalse(self.sync_swift._is_throttle_error(
+            RuntimeError('failed')))
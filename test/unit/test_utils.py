@@ -16,8 +16,13 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import eventlet
+import json
 import mock
+import StringIO
+from s3_sync import limits
 from s3_sync import utils
+from s3_sync.cache import LRUCache
 import unittest
 from utils import FakeStream
 
@@ -78,6 +83,12 @@ class FakeSwift(object):
                 self.fake_stream)
 
 
+def fake_body(*chunks):
+    body = mock.MagicMock()
+    body.__iter__.return_value = iter(chunks)
+    return body
+
+
 class TestFileWrapper(unittest.TestCase):
     def setUp(self):
         self.mock_swift = FakeSwift()
@@ -98,6 +109,144 @@ class TestFileWrapper(unittest.TestCase):
         wrapper.seek(0)
         self.assertEqual(0, self.mock_swift.fake_stream.current_pos)
 
+    def test_seek_offset(self):
+        swift = mock.Mock()
+        swift.get_object.side_effect = [
+            (200, {'Content-Length': 10, 'Etag': 'deadbeef'},
+             fake_body('01', '23', '45', '67', '89')),
+            (206, {'Content-Length': 6, 'Etag': 'deadbeef'},
+             fake_body('45', '67', '89')),
+            (206, {'Content-Length': 2, 'Etag': 'deadbeef'},
+             fake_body('89'))]
+        wrapper = utils.FileWrapper(swift, 'account', 'container', 'key',
+                                    {'X-Newest': True})
+        self.assertEqual('01', wrapper.read(2))
+        wrapper.seek(4)
+        self.assertEqual(4, wrapper.tell())
+        self.assertEqual('45', wrapper.read(2))
+        wrapper.seek(-2, 2)
+        self.assertEqual('89', wrapper.read())
+        self.assertEqual(10, len(wrapper))
+        self.assertEqual('', wrapper.read())
+        swift.get_object.assert_has_calls([
+            mock.call('account', 'container', 'key',
+                      headers={'X-Newest': True}),
+            mock.call('account', 'container', 'key',
+                      headers={'X-Newest': True, 'If-Match': 'deadbeef',
+                               'Range': 'bytes=4-'}),
+            mock.call('account', 'container', 'key',
+                      headers={'X-Newest': True, 'If-Match': 'deadbeef',
+                               'Range': 'bytes=8-'})])
+
+        with self.assertRaises(RuntimeError):
+            wrapper.seek(11)
+
+    def test_resume_after_read_error(self):
+        def broken_iter():
+            yield '01'
+            raise IOError('timeout')
+
+        broken_body = mock.MagicMock()
+        broken_body.__iter__.return_value = broken_iter()
+        swift = mock.Mock()
+        swift.get_object.side_effect = [
+            (200, {'Content-Length': 4, 'Etag': 'deadbeef'}, broken_body),
+            (206, {'Content-Length': 2, 'Etag': 'deadbeef'},
+             fake_body('23'))]
+        wrapper = utils.FileWrapper(swift, 'account', 'container', 'key')
+        self.assertEqual('01', wrapper.read(2))
+        self.assertEqual('23', wrapper.read(2))
+        broken_body.close.assert_called_once_with()
+        swift.get_object.assert_called_with(
+            'account', 'container', 'key',
+            headers={'If-Match': 'deadbeef', 'Range': 'bytes=2-'})
+
+    def test_resume_gives_up(self):
+        def get_object(account, container, key, headers):
+            if 'Range' in headers:
+                return (206, {'Content-Length': 2}, fake_body())
+            return (200, {'Content-Length': 4}, fake_body('01'))
+
+        swift = mock.Mock()
+        swift.get_object.side_effect = get_object
+        wrapper = utils.FileWrapper(swift, 'account', 'container', 'key')
+        self.assertEqual('01', wrapper.read())
+        with self.assertRaises(RuntimeError):
+            wrapper.read()
+        self.assertEqual(1 + utils.FileWrapper.MAX_RESUME_ATTEMPTS,
+                         swift.get_object.call_count)
+
+    def test_read_chunks(self):
+        chunk = 'A' * 4096
+        swift = mock.Mock()
+        swift.get_object.return_value = (
+            200, {'Content-Length': 8192}, fake_body(chunk, '', chunk))
+        wrapper = utils.FileWrapper(swift, 'account', 'container', 'key')
+        # Whole chunks are returned without copying them
+        self.assertIs(chunk, wrapper.read(65536))
+        self.assertEqual('A' * 10, wrapper.read(10))
+        self.assertEqual('A' * 4086, wrapper.read())
+        self.assertEqual('', wrapper.read())
+
+    def test_iter_chunk_size(self):
+        swift = mock.Mock()
+        swift.get_object.return_value = (
+            200, {'Content-Length': 5}, fake_body('abcde'))
+        wrapper = utils.FileWrapper(swift, 'account', 'container', 'key',
+                                    chunk_size=2)
+        self.assertEqual(['ab', 'cd', 'e'], list(wrapper))
+
+    def test_spool(self):
+        self.addCleanup(limits.configure_limits, {})
+        limits.configure_limits({'spool_memory_limit': 1536})
+        wrapper = utils.FileWrapper(self.mock_swift, 'account', 'container',
+                                    'key', spool_size=1024)
+        stream = self.mock_swift.fake_stream
+        self.assertTrue(stream.closed)
+        self.assertEqual('A' * 1024, wrapper.read())
+        wrapper.seek(1000)
+        self.assertEqual('A' * 24, wrapper.read(100))
+        wrapper.seek(0)
+        self.assertEqual('A' * 10, wrapper.read(10))
+        self.assertEqual(10, wrapper.tell())
+        # Retries are served from the spool
+        self.assertIs(stream, self.mock_swift.fake_stream)
+
+        # Not enough space left under the limit: the object is streamed
+        other = utils.FileWrapper(self.mock_swift, 'account', 'container',
+                                  'key', spool_size=1024)
+        self.assertFalse(self.mock_swift.fake_stream.closed)
+        other.close()
+
+        wrapper.close()
+        wrapper = utils.FileWrapper(self.mock_swift, 'account', 'container',
+                                    'key', spool_size=1024)
+        self.assertTrue(self.mock_swift.fake_stream.closed)
+        wrapper.close()
+
+    def test_spool_large_object(self):
+        wrapper = utils.FileWrapper(self.mock_swift, 'account', 'container',
+                                    'key', spool_size=1023)
+        self.assertFalse(self.mock_swift.fake_stream.closed)
+        wrapper.close()
+
+    def test_spool_rate_limited(self):
+        self.addCleanup(limits.configure_limits, {})
+        limits.configure_limits({'spool_memory_limit': 1024})
+        limiter = mock.Mock()
+        wrapper = utils.FileWrapper(self.mock_swift, 'account', 'container',
+                                    'key', rate_limiter=limiter,
+                                    spool_size=1024)
+        # Spooling the object does not use the remote bandwidth
+        limiter.consume_bytes.assert_not_called()
+        self.assertEqual(1024, len(wrapper.read()))
+        # ... but every read of the spool, including the retries, does
+        wrapper.reset()
+        self.assertEqual(1024, len(wrapper.read()))
+        self.assertEqual([mock.call(1024), mock.call(1024)],
+                         limiter.consume_bytes.mock_calls)
+        wrapper.close()
+
 
 class TestSLOFileWrapper(unittest.TestCase):
     def setUp(self):
@@ -178,3 +327,244 @@ class TestSLOFileWrapper(unittest.TestCase):
             mock.call('account', 'foo', 'part2', {}))
         self.assertEqual(True, part1_content.closed)
         self.assertEqual(True, part2_content.closed)
+
+
+class TestBodyReader(unittest.TestCase):
+    def test_read(self):
+        chunks = ['abc', 'defgh', 'i']
+        reader = utils.BodyReader(chunks)
+        # The chunks that fit in the read are not copied
+        self.assertIs(chunks[0], reader.read(3))
+        self.assertEqual('de', reader.read(2))
+        self.assertEqual('fghi', reader.read(10))
+        self.assertEqual('', reader.read(10))
+
+    def test_read_all(self):
+        reader = utils.BodyReader(iter(['abc', '', 'def']))
+        self.assertEqual('a', reader.read(1))
+        self.assertEqual('bcdef', reader.read())
+        self.assertEqual('', reader.read())
+
+
+class FakeApp(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, env, start_response):
+        body = env['wsgi.input'].read() if 'wsgi.input' in env else ''
+        self.calls.append((env['REQUEST_METHOD'], env['PATH_INFO'], body))
+        start_response('201 Created', [])
+        return []
+
+
+class FakeRemoteBody(object):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.closed = False
+
+    def next(self):
+        return next(self.chunks)
+
+    def __iter__(self):
+        return self
+
+    def close(self):
+        self.closed = True
+
+
+class TestSwiftPutWrapper(unittest.TestCase):
+    def test_restore(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        wrapper = utils.SwiftPutWrapper(
+            iter(['abc', 'def']), {'Content-Length': 6}, '/v1/a/c/o', app,
+            None, pool=pool)
+        self.assertEqual(['abc', 'def'], list(wrapper))
+        pool.waitall()
+        self.assertEqual([('PUT', '/v1/a/c/o', 'abcdef')], app.calls)
+
+    def test_restore_after_disconnect(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        body = FakeRemoteBody(['abc', 'def'])
+        wrapper = utils.SwiftPutWrapper(
+            body, {'Content-Length': 6}, '/v1/a/c/o', app, None, pool=pool)
+        self.assertEqual('abc', next(wrapper))
+        wrapper.close()
+        self.assertEqual([], app.calls)
+        pool.waitall()
+        self.assertEqual([('PUT', '/v1/a/c/o', 'abcdef')], app.calls)
+        self.assertTrue(body.closed)
+
+    def test_restore_pool_full(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool(1)
+        release = eventlet.event.Event()
+        pool.spawn_n(release.wait)
+        on_finish = mock.Mock()
+        body = FakeRemoteBody(['abc', 'def'])
+        wrapper = utils.SwiftPutWrapper(
+            body, {'Content-Length': 6}, '/v1/a/c/o', app, None, pool=pool,
+            on_finish=on_finish)
+        # The response is not held up by the restores in progress
+        self.assertEqual(['abc', 'def'], list(wrapper))
+        self.assertTrue(wrapper.spool.closed)
+        self.assertTrue(body.closed)
+        on_finish.assert_called_once_with()
+        release.send()
+        pool.waitall()
+        self.assertEqual([], app.calls)
+
+    def test_slo_restore(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        manifest = [{'name': '/segments/part1', 'bytes': 4, 'hash': 'a'},
+                    {'name': '/segments/part2', 'bytes': 2, 'hash': 'b'}]
+        wrapper = utils.SwiftSloPutWrapper(
+            StringIO.StringIO('abcdef'),
+            {'Content-Length': 6, utils.SLO_HEADER: 'True'},
+            '/v1/a/c/o', app, manifest, None, chunk_size=5, pool=pool)
+        self.assertEqual(['abcde', 'f'], list(wrapper))
+        pool.waitall()
+        self.assertEqual([('PUT', '/v1/a/segments', ''),
+                          ('PUT', '/v1/a/segments/part1', 'abcd'),
+                          ('PUT', '/v1/a/segments/part2', 'ef'),
+                          ('PUT', '/v1/a/c/o', mock.ANY)], app.calls)
+        self.assertEqual(
+            [{'path': '/segments/part1', 'size_bytes': 4, 'etag': 'a'},
+             {'path': '/segments/part2', 'size_bytes': 2, 'etag': 'b'}],
+            json.loads(app.calls[-1][2]))
+
+    def test_slo_restore_parallel_segments(self):
+        class InterleavingApp(FakeApp):
+            def __call__(self, env, start_response):
+                body = ''
+                if 'wsgi.input' in env:
+                    # Yield between the reads, so that the uploads of the
+                    # segments are interleaved
+                    while True:
+                        chunk = env['wsgi.input'].read(1)
+                        if not chunk:
+                            break
+                        body += chunk
+                        eventlet.sleep(0)
+                self.calls.append(
+                    (env['REQUEST_METHOD'], env['PATH_INFO'], body))
+                start_response('201 Created', [])
+                return []
+
+        app = InterleavingApp()
+        pool = eventlet.GreenPool()
+        manifest = [{'name': '/segments/part1', 'bytes': 3, 'hash': 'a'},
+                    {'name': '/segments/part2', 'bytes': 2, 'hash': 'b'},
+                    {'name': '/segments/part3', 'bytes': 1, 'hash': 'c'}]
+        wrapper = utils.SwiftSloPutWrapper(
+            StringIO.StringIO('abcdef'),
+            {'Content-Length': 6, utils.SLO_HEADER: 'True'},
+            '/v1/a/c/o', app, manifest, None, pool=pool,
+            segment_concurrency=3)
+        self.assertEqual(['abcdef'], list(wrapper))
+        pool.waitall()
+        self.assertEqual(('PUT', '/v1/a/segments', ''), app.calls[0])
+        self.assertEqual(
+            sorted([('PUT', '/v1/a/segments/part1', 'abc'),
+                    ('PUT', '/v1/a/segments/part2', 'de'),
+                    ('PUT', '/v1/a/segments/part3', 'f')]),
+            sorted(app.calls[1:4]))
+        self.assertEqual(('PUT', '/v1/a/c/o', mock.ANY), app.calls[-1])
+
+    def test_slo_restore_cached_segments_container(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        cache = LRUCache(10, 60)
+        manifest = [{'name': '/segments/part1', 'bytes': 6, 'hash': 'a'}]
+        for _ in range(2):
+            wrapper = utils.SwiftSloPutWrapper(
+                StringIO.StringIO('abcdef'),
+                {'Content-Length': 6, utils.SLO_HEADER: 'True'},
+                '/v1/a/c/o', app, manifest, None, pool=pool,
+                container_cache=cache)
+            self.assertEqual(['abcdef'], list(wrapper))
+            pool.waitall()
+        self.assertEqual([('PUT', '/v1/a/segments', ''),
+                          ('PUT', '/v1/a/segments/part1', 'abcdef'),
+                          ('PUT', '/v1/a/c/o', mock.ANY),
+                          ('PUT', '/v1/a/segments/part1', 'abcdef'),
+                          ('PUT', '/v1/a/c/o', mock.ANY)], app.calls)
+        self.assertTrue(cache.get('/v1/a/segments'))
+
+    @mock.patch('s3_sync.utils.tempfile.TemporaryFile')
+    def test_restore_spool_dir(self, mock_tempfile):
+        utils.SwiftPutWrapper(iter([]), {}, '/v1/a/c/o', FakeApp(), None,
+                              spool_dir='/spool')
+        mock_tempfile.assert_called_once_with(dir='/spool')
+
+    def test_restore_streamed(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        on_finish = mock.Mock()
+        body = FakeRemoteBody(['abc', 'def'])
+        with mock.patch('s3_sync.utils.tempfile.TemporaryFile') as \
+                mock_tempfile:
+            wrapper = utils.SwiftPutWrapper(
+                body, {'Content-Length': 6}, '/v1/a/c/o', app, None,
+                pool=pool, on_finish=on_finish, size=6)
+            self.assertEqual(['abc', 'def'], list(wrapper))
+        mock_tempfile.assert_not_called()
+        pool.waitall()
+        self.assertEqual([('PUT', '/v1/a/c/o', 'abcdef')], app.calls)
+        self.assertTrue(body.closed)
+        on_finish.assert_called_once_with()
+
+    def test_restore_streamed_disconnect(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        body = FakeRemoteBody(['abc', 'def'])
+        wrapper = utils.SwiftPutWrapper(
+            body, {'Content-Length': 6}, '/v1/a/c/o', app, None, pool=pool,
+            size=6)
+        self.assertEqual('abc', next(wrapper))
+        wrapper.close()
+        pool.waitall()
+        # The partial object is not restored
+        self.assertEqual([], app.calls)
+        self.assertTrue(body.closed)
+
+    def test_restore_streamed_put_behind(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        chunks = ['a'] * (utils.SwiftPutWrapper.MAX_PENDING_CHUNKS + 1)
+        wrapper = utils.SwiftPutWrapper(
+            iter(chunks), {'Content-Length': len(chunks)}, '/v1/a/c/o', app,
+            None, pool=pool, size=len(chunks))
+        # The client is not held up by the local PUT
+        self.assertEqual(chunks, list(wrapper))
+        pool.waitall()
+        self.assertEqual([], app.calls)
+
+    def test_slo_restore_streamed(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        manifest = [{'name': '/segments/part1', 'bytes': 4, 'hash': 'a'},
+                    {'name': '/segments/part2', 'bytes': 2, 'hash': 'b'}]
+        wrapper = utils.SwiftSloPutWrapper(
+            FakeRemoteBody(['abc', 'def']),
+            {'Content-Length': 6, utils.SLO_HEADER: 'True'},
+            '/v1/a/c/o', app, manifest, None, pool=pool,
+            segment_concurrency=2, size=6)
+        self.assertEqual(['abc', 'def'], list(wrapper))
+        pool.waitall()
+        self.assertEqual([('PUT', '/v1/a/segments', ''),
+                          ('PUT', '/v1/a/segments/part1', 'abcd'),
+                          ('PUT', '/v1/a/segments/part2', 'ef'),
+                          ('PUT', '/v1/a/c/o', mock.ANY)], app.calls)
+
+    def test_slo_restore_without_manifest(self):
+        app = FakeApp()
+        pool = eventlet.GreenPool()
+        wrapper = utils.SwiftSloPutWrapper(
+            StringIO.StringIO('abcdef'), {'Content-Length': 6},
+            '/v1/a/c/o', app, eventlet.spawn(lambda: None), None, pool=pool)
+        self.assertEqual(['abcdef'], list(wrapper))
+        pool.waitall()
+        self.assertEqual([('PUT', '/v1/a/c/o', 'abcdef')], app.calls)
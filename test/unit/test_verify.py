@@ -375,7 +375,7 @@ class TestMainTrackClientCalls(unittest.TestCase):
             mock.call.head_object('some-bucket', 'cloud_sync_test_object'),
             mock.call.put_object(
                 'some-bucket', 'cloud_sync_test_object', mock.ANY,
-                content_length=15, etag=mock.ANY,
+                chunk_size=65536, content_length=15, etag=mock.ANY,
                 headers={'content-type': 'text/plain'}),
             mock.call.post_object(
                 'some-bucket', 'cloud_sync_test_object',